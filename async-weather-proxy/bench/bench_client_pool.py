@@ -0,0 +1,64 @@
+"""
+Сколько TCP/TLS-рукопожатий приходится на один запрос к апстриму:
+новый httpx.AsyncClient на каждый вызов (старое поведение) против общего клиента.
+
+    python bench/bench_client_pool.py --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.stub_upstream import StubUpstream  # noqa: E402
+from clients import weather  # noqa: E402
+
+
+async def _run(n: int, concurrency: int, call) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            await call(50 + i % 10, 10 + i % 7)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return time.perf_counter() - started
+
+
+async def main(n: int, concurrency: int) -> None:
+    stub = await StubUpstream().start()
+    weather.OPEN_METEO_URL = stub.url
+
+    async def per_call_client(lat, lon):
+        async with httpx.AsyncClient(timeout=httpx.Timeout(5.0, connect=2.0)) as client:
+            resp = await client.get(stub.url, params={"latitude": lat, "longitude": lon})
+            resp.raise_for_status()
+            return resp.json()
+
+    async def shared_client(lat, lon):
+        return await weather.fetch_weather(lat, lon)
+
+    print(f"{'mode':<12} {'requests':>8} {'handshakes':>10} {'per req':>8} {'req/s':>8}")
+    for name, call in (("per-call", per_call_client), ("shared", shared_client)):
+        stub.reset()
+        await weather.startup()
+        elapsed = await _run(n, concurrency, call)
+        await weather.shutdown()
+        print(
+            f"{name:<12} {stub.requests:>8} {stub.connections:>10} "
+            f"{stub.connections / max(stub.requests, 1):>8.3f} {n / elapsed:>8.0f}"
+        )
+    await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
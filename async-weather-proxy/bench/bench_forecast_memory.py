@@ -0,0 +1,69 @@
+"""
+Память под почасовой прогноз: список dict'ов на каждый час против колонок array.
+
+    python bench/bench_forecast_memory.py --locations 2000 --days 7
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache.series import HourlySeries, rounded  # noqa: E402
+from clients.weather import HOURLY_VARIABLES  # noqa: E402
+
+
+def make_hourly(hours: int, rnd: random.Random) -> dict:
+    hourly = {"time": [f"2025-01-{1 + h // 24:02d}T{h % 24:02d}:00" for h in range(hours)]}
+    for source in HOURLY_VARIABLES.values():
+        hourly[source] = [round(rnd.uniform(-10, 30), 1) for _ in range(hours)]
+    return hourly
+
+
+def as_rows(hourly: dict) -> list[dict]:
+    return [
+        {"time": t, **{name: hourly[source][i] for name, source in HOURLY_VARIABLES.items()}}
+        for i, t in enumerate(hourly["time"])
+    ]
+
+
+def measure(build, payloads) -> tuple[int, list]:
+    tracemalloc.start()
+    kept = [build(p) for p in payloads]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, kept
+
+
+def main(locations: int, days: int) -> None:
+    rnd = random.Random(42)
+    hours = days * 24
+    payloads = [make_hourly(hours, rnd) for _ in range(locations)]
+    values = locations * hours * len(HOURLY_VARIABLES)
+    print(f"{locations} locations x {hours} h x {len(HOURLY_VARIABLES)} variables = {values} values")
+    print(f"{'layout':>14} {'MiB':>8} {'bytes/value':>12}")
+    for name, build in (
+        ("list of dicts", as_rows),
+        ("array columns", lambda p: HourlySeries.from_open_meteo(p, HOURLY_VARIABLES)),
+    ):
+        size, kept = measure(build, payloads)
+        print(f"{name:>14} {size / 2**20:>8.1f} {size / values:>12.1f}")
+
+    series = kept[0]
+    begin = series.times[0]
+    started = time.perf_counter()
+    for _ in range(10000):
+        times, columns = series.slice(begin + 24 * 3600, begin + 48 * 3600, ["temperature", "wind_speed"])
+        {name: rounded(v) for name, v in columns.items()}
+    print(f"24 h x 2 variables window: {(time.perf_counter() - started) / 10000 * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--locations", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+    main(args.locations, args.days)
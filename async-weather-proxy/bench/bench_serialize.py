@@ -0,0 +1,88 @@
+"""
+Стоимость сериализации ответа на хите кэша /weather.
+
+1. Микробенчмарк одного ответа: старый путь (dict-merge -> jsonable_encoder -> json.dumps)
+   против orjson и против подклейки готовых байтов записи.
+2. Хиты /weather через весь ASGI-стек (httpx.ASGITransport, без сети) — запросов/с на одно ядро.
+
+    python bench/bench_serialize.py --iterations 200000 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+import main as proxy  # noqa: E402
+from cache.keys import cell_key, cell_of  # noqa: E402
+from responses import splice  # noqa: E402
+
+DATA = {
+    "temperature": 3.4,
+    "wind_speed": 11.2,
+    "observed_at": "2025-01-01T12:00",
+    "source": "open-meteo",
+    "timezone": "Europe/Berlin",
+    "cell": {"lat": 52.51797, "lon": 13.40316},
+}
+HEAD = {"lat": 52.52, "lon": 13.405, "units": "metric"}
+
+
+def legacy() -> bytes:
+    obj = jsonable_encoder({**HEAD, **DATA, "cached": True, "stale": False})
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def orjson_dict() -> bytes:
+    return orjson.dumps({**HEAD, **DATA, "cached": True, "stale": False})
+
+
+BODY = orjson.dumps(DATA)
+
+
+def spliced() -> bytes:
+    return splice(HEAD, BODY, True, False)
+
+
+def micro(iterations: int) -> None:
+    assert json.loads(legacy()) == json.loads(spliced()) == json.loads(orjson_dict())
+    print(f"{'path':>22} {'µs/response':>12} {'responses/s':>12}")
+    for name, fn in (("jsonable_encoder+json", legacy), ("orjson dict", orjson_dict), ("spliced bytes", spliced)):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - started
+        print(f"{name:>22} {elapsed / iterations * 1e6:>12.2f} {iterations / elapsed:>12.0f}")
+
+
+async def end_to_end(requests: int) -> None:
+    cell = cell_of(HEAD["lat"], HEAD["lon"])
+    await proxy.cache.set(cell_key(cell, "metric"), DATA, ttl_sec=3600)
+    transport = httpx.ASGITransport(app=proxy.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+        params = {"lat": HEAD["lat"], "lon": HEAD["lon"]}
+        for _ in range(200):  # прогрев
+            await client.get("/weather", params=params)
+        started = time.perf_counter()
+        for _ in range(requests):
+            r = await client.get("/weather", params=params)
+        elapsed = time.perf_counter() - started
+    assert r.json()["cached"] is True
+    print(f"\n/weather cache hits through ASGI: {requests / elapsed:.0f} req/s per core "
+          f"({elapsed / requests * 1e6:.0f} µs/request, includes httpx client overhead)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    micro(args.iterations)
+    asyncio.run(end_to_end(args.requests))
@@ -0,0 +1,72 @@
+"""
+Снимок кэша: время записи, размер файла, время до готовности воркера
+и полной фоновой загрузки для N записей.
+
+    python bench/bench_snapshot.py --entries 1000000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import snapshot  # noqa: E402
+from cache.memory import MemoryCache  # noqa: E402
+
+
+async def main(entries: int) -> None:
+    source = MemoryCache(max_entries=0, max_bytes=0)
+    for i in range(entries):
+        await source.set(
+            f"w:{i % 900 * 0.1:.5f}:{i // 900 * 0.1:.5f}:metric",
+            {
+                "temperature": 12.3,
+                "wind_speed": 4.5,
+                "observed_at": "2025-01-01T12:00",
+                "source": "open-meteo",
+                "timezone": "GMT",
+                "cell": {"lat": 1.0, "lon": 2.0},
+            },
+            ttl_sec=300,
+            stale_ttl_sec=600,
+        )
+
+    path = os.path.join(tempfile.mkdtemp(), "cache.snapshot")
+    started = time.perf_counter()
+    saved = await snapshot.save(source, path)
+    save_s = time.perf_counter() - started
+    size_mb = os.path.getsize(path) / 1e6
+    del source
+
+    target = MemoryCache(max_entries=0, max_bytes=0)
+    started = time.perf_counter()
+    loader = asyncio.create_task(snapshot.load(target, path))
+    await asyncio.sleep(0)
+    ready_s = time.perf_counter() - started  # воркер уже может отвечать
+
+    # пока грузится снимок, event loop продолжает обслуживать запросы
+    stalls = []
+    while not loader.done():
+        t = time.perf_counter()
+        await asyncio.sleep(0)
+        stalls.append(time.perf_counter() - t)
+    loaded = await loader
+    load_s = time.perf_counter() - started
+
+    print(f"entries           {saved}")
+    print(f"snapshot size     {size_mb:.1f} MB")
+    print(f"save              {save_s:.2f} s (in a worker thread)")
+    print(f"ready to serve    {ready_s * 1000:.2f} ms")
+    print(f"background load   {load_s:.2f} s ({loaded} entries)")
+    print(f"max loop stall    {max(stalls, default=0) * 1000:.1f} ms")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.entries))
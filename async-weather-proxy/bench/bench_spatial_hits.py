@@ -0,0 +1,60 @@
+"""
+Hit rate кэша на трассе координат с GPS-дрожанием при разном размере ячейки.
+
+Трасса: N «устройств», каждое опрашивает свою точку, к каждому запросу
+добавляется гауссов шум в метрах. Ключи считаются так же, как в прокси.
+
+    python bench/bench_spatial_hits.py --devices 200 --requests 50000 --jitter-m 15
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache.keys import KM_PER_DEGREE, cell_key, cell_of  # noqa: E402
+
+
+def make_trace(devices: int, requests: int, jitter_m: float, seed: int = 42):
+    rnd = random.Random(seed)
+    homes = [(rnd.uniform(35, 60), rnd.uniform(-10, 30)) for _ in range(devices)]
+    for _ in range(requests):
+        lat, lon = rnd.choice(homes)
+        dlat = rnd.gauss(0, jitter_m) / 1000 / KM_PER_DEGREE
+        dlon = rnd.gauss(0, jitter_m) / 1000 / (KM_PER_DEGREE * math.cos(math.radians(lat)))
+        yield lat + dlat, lon + dlon
+
+
+def replay(trace, km: float) -> tuple[float, int]:
+    seen = set()
+    hits = 0
+    total = 0
+    for lat, lon in trace:
+        key = cell_key(cell_of(lat, lon, km), "metric")
+        total += 1
+        if key in seen:
+            hits += 1
+        else:
+            seen.add(key)
+    return hits / total, len(seen)
+
+
+def main(devices: int, requests: int, jitter_m: float) -> None:
+    trace = list(make_trace(devices, requests, jitter_m))
+    print(f"{devices} devices, {requests} requests, jitter σ={jitter_m} m (TTL not modelled)")
+    print(f"{'grid':>10} {'hit rate':>9} {'upstream':>9}")
+    for km in (0, 0.25, 0.5, 1.0, 2.0, 5.0):
+        rate, upstream = replay(trace, km)
+        label = "4dp" if km == 0 else f"{km} km"
+        print(f"{label:>10} {rate:>9.3f} {upstream:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--jitter-m", type=float, default=15.0)
+    args = parser.parse_args()
+    main(args.devices, args.requests, args.jitter_m)
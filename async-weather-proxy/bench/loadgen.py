@@ -0,0 +1,213 @@
+"""
+Нагрузочный прогон прокси против локальной заглушки Open-Meteo.
+
+Модель нагрузки открытая: запросы уходят по расписанию с целевым RPS, не дожидаясь
+ответов на предыдущие. Латентность считается от запланированного момента отправки,
+так что очередь внутри прокси не прячется (coordinated omission).
+
+По умолчанию прокси поднимается в этом же процессе (httpx.ASGITransport + lifespan).
+С --target нагружается внешний uvicorn; его OPEN_METEO_URL должен смотреть на
+заглушку (--stub-port задаёт её порт).
+
+    python bench/loadgen.py --rps 500 --duration 10 --keys 2000 --dist zipf
+    python bench/loadgen.py --endpoint batch --batch-size 50 --rps 20 --dist jittered --latency-ms 80 --throttle-rate 0.02
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+from itertools import accumulate
+from typing import Callable, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import stub_upstream  # noqa: E402
+from bench.stub_upstream import StubUpstream  # noqa: E402
+from cache.keys import KM_PER_DEGREE  # noqa: E402
+
+Point = tuple[float, float]
+
+
+def key_sampler(dist: str, keys: int, zipf_s: float = 1.1, jitter_m: float = 15.0, seed: int = 42) -> Callable[[], Point]:
+    """
+    Генератор координат запросов:
+    uniform  — равномерно по keys точкам;
+    zipf     — точка i с весом 1/i^s (немного горячих ключей и длинный хвост);
+    jittered — как zipf, но к каждой точке добавлен гауссов шум в метрах (GPS-дрожание).
+    """
+    rnd = random.Random(seed)
+    points = [(rnd.uniform(35, 60), rnd.uniform(-10, 30)) for _ in range(keys)]
+    if dist == "uniform":
+        return lambda: rnd.choice(points)
+
+    cumulative = list(accumulate(1 / (i + 1) ** zipf_s for i in range(keys)))
+
+    def zipf() -> Point:
+        return points[bisect.bisect_left(cumulative, rnd.random() * cumulative[-1])]
+
+    if dist == "zipf":
+        return zipf
+
+    def jittered() -> Point:
+        lat, lon = zipf()
+        dlat = rnd.gauss(0, jitter_m) / 1000 / KM_PER_DEGREE
+        dlon = rnd.gauss(0, jitter_m) / 1000 / (KM_PER_DEGREE * math.cos(math.radians(lat)))
+        return round(lat + dlat, 6), round(lon + dlon, 6)
+
+    return jittered
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    """Nearest-rank перцентиль по отсортированному списку."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(math.ceil(p / 100 * len(ordered)) - 1, 0))]
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    sample: Callable[[], Point],
+    endpoint: str = "weather",
+    rps: float = 100,
+    duration: float = 10,
+    batch_size: int = 50,
+) -> dict:
+    """Отправить rps * duration запросов по расписанию и собрать латентности и хиты."""
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    counts = {"items": 0, "hits": 0, "item_errors": 0}
+
+    async def one(scheduled: float) -> None:
+        try:
+            if endpoint == "batch":
+                payload = {"items": [{"lat": lat, "lon": lon} for lat, lon in (sample() for _ in range(batch_size))]}
+                resp = await client.post("/batch/weather", json=payload)
+            else:
+                lat, lon = sample()
+                resp = await client.get("/weather", params={"lat": lat, "lon": lon})
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+            return
+        latencies.append(time.perf_counter() - scheduled)
+        statuses[resp.status_code] += 1
+        if resp.status_code != 200:
+            return
+        body = resp.json()
+        for item in body if isinstance(body, list) else [body]:
+            counts["items"] += 1
+            if "error" in item:
+                counts["item_errors"] += 1
+            elif item.get("cached"):
+                counts["hits"] += 1
+
+    total = int(rps * duration)
+    tasks = []
+    started = time.perf_counter()
+    for i in range(total):
+        scheduled = started + i / rps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(scheduled)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    served = counts["items"] - counts["item_errors"]
+    return {
+        "endpoint": endpoint,
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "items_per_s": round(counts["items"] / elapsed, 1),
+        "latency_ms": {
+            name: round(percentile(latencies, p) * 1000, 2)
+            for name, p in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        },
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "hit_ratio": round(counts["hits"] / served, 4) if served else 0.0,
+        **counts,
+    }
+
+
+def print_report(report: dict) -> None:
+    lat = report["latency_ms"]
+    print(f"endpoint      /{report['endpoint']}  ({report['requests']} requests in {report['elapsed_s']} s)")
+    print(f"throughput    {report['throughput_rps']} req/s, {report['items_per_s']} items/s")
+    print(f"latency ms    p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"statuses      {report['statuses']}")
+    print(f"hit ratio     {report['hit_ratio']}  (items {report['items']}, item errors {report['item_errors']})")
+    up = report["upstream"]
+    print(
+        f"upstream      {up['requests']} calls for {up['locations']} locations, "
+        f"{up['throttled']} x 429, {up['errors']} x 500, {up['connections']} connections"
+    )
+    proxy = report.get("proxy") or {}
+    if proxy:
+        print(
+            f"proxy cache   hits {proxy.get('hits')}  stale {proxy.get('stale_hits')}  misses {proxy.get('misses')}  "
+            f"coalesced {proxy.get('coalesced')}  refreshes {proxy.get('refreshes')}"
+        )
+
+
+async def main(args: argparse.Namespace) -> dict:
+    stub = await StubUpstream(port=args.stub_port, seed=args.seed, **stub_upstream.options(args)).start()
+    sample = key_sampler(args.dist, args.keys, args.zipf_s, args.jitter_m, args.seed)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    try:
+        if args.target:
+            print(f"stub upstream on {stub.url}; point the proxy's OPEN_METEO_URL at it", file=sys.stderr)
+            async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=30) as client:
+                report = await drive(client, sample, args.endpoint, args.rps, args.duration, args.batch_size)
+                proxy_stats = (await client.get("/cache/weather/stats")).json()
+        else:
+            import main as proxy
+            from clients import weather as upstream
+
+            upstream.OPEN_METEO_URL = stub.url
+            transport = httpx.ASGITransport(app=proxy.app)
+            async with proxy.app.router.lifespan_context(proxy.app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://proxy", timeout=30) as client:
+                    report = await drive(client, sample, args.endpoint, args.rps, args.duration, args.batch_size)
+                    proxy_stats = (await client.get("/cache/weather/stats")).json()
+    finally:
+        await stub.stop()
+    report["upstream"] = stub.stats()
+    report["proxy"] = proxy_stats
+    return report
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default="", help="URL запущенного прокси; по умолчанию — в этом процессе")
+    parser.add_argument("--endpoint", choices=("weather", "batch"), default="weather")
+    parser.add_argument("--rps", type=float, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--connections", type=int, default=100, help="пул соединений к --target")
+    parser.add_argument("--dist", choices=("uniform", "zipf", "jittered"), default="zipf")
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--jitter-m", type=float, default=15.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stub-port", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="отчёт одной JSON-строкой (для сравнения прогонов)")
+    stub_upstream.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
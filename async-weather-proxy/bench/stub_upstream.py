@@ -0,0 +1,223 @@
+"""
+Локальная заглушка Open-Meteo для бенчмарков.
+
+Минимальный HTTP/1.1 сервер на asyncio с keep-alive. Считает принятые
+TCP-соединения (= рукопожатия) и запросы, отвечает JSON в формате /v1/forecast.
+Умеет изображать плохой апстрим: задержка с разбросом, редкие очень медленные
+ответы (хвост латентности), доля 500 и доля 429 с Retry-After.
+
+    python bench/stub_upstream.py --port 8089 --latency-ms 80 --jitter-ms 40 --slow-rate 0.02 --slow-ms 3000 \
+        --error-rate 0.01 --throttle-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import parse_qs, urlsplit
+
+REASONS = {200: b"OK", 429: b"Too Many Requests", 500: b"Internal Server Error"}
+
+
+class StubUpstream:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 1.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+        seed: int = 42,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency  # секунды до ответа
+        self.jitter = jitter  # ± равномерный разброс задержки
+        self.error_rate = error_rate  # доля ответов 500
+        self.throttle_rate = throttle_rate  # доля ответов 429
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate  # доля ответов с задержкой slow_latency вместо latency
+        self.slow_latency = slow_latency
+        self._random = random.Random(seed)
+        self.connections = 0
+        self.requests = 0
+        self.locations = 0  # точек во всех успешных ответах (для multi-location запросов > requests)
+        self.errors = 0
+        self.throttled = 0
+        self._server: asyncio.AbstractServer | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._handlers: set[asyncio.Task] = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1/forecast"
+
+    async def start(self) -> "StubUpstream":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def reset(self) -> None:
+        self.connections = 0
+        self.requests = 0
+        self.locations = 0
+        self.errors = 0
+        self.throttled = 0
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "requests": self.requests,
+            "locations": self.locations,
+            "errors": self.errors,
+            "throttled": self.throttled,
+        }
+
+    def build_body(self, query: dict) -> bytes:
+        lats = query.get("latitude", ["0"])[0].split(",")
+        lons = query.get("longitude", ["0"])[0].split(",")
+        points = [
+            {
+                "latitude": float(lat),
+                "longitude": float(lon),
+                "timezone": "GMT",
+                "current": {"time": "2025-01-01T12:00", "temperature_2m": 12.3, "wind_speed_10m": 4.5},
+            }
+            for lat, lon in zip(lats, lons)
+        ]
+        if "hourly" in query:
+            hours = int(query.get("forecast_days", ["7"])[0]) * 24
+            hourly = {"time": [f"2025-01-{1 + h // 24:02d}T{h % 24:02d}:00" for h in range(hours)]}
+            for name in query["hourly"][0].split(","):
+                hourly[name] = [round(10 + (h % 24) / 4, 1) for h in range(hours)]
+            for point in points:
+                point["utc_offset_seconds"] = 0
+                point["hourly"] = hourly
+        self.locations += len(points)
+        return json.dumps(points[0] if len(points) == 1 else points).encode()
+
+    def _status(self) -> int:
+        roll = self._random.random()
+        if roll < self.throttle_rate:
+            self.throttled += 1
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            self.errors += 1
+            return 500
+        return 200
+
+    async def respond(self, writer: asyncio.StreamWriter, query: dict) -> None:
+        if self.slow_rate and self._random.random() < self.slow_rate:
+            await asyncio.sleep(self.slow_latency)
+        elif self.latency or self.jitter:
+            await asyncio.sleep(max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0))
+        status = self._status()
+        headers = b"Content-Type: application/json\r\n"
+        if status == 200:
+            body = self.build_body(query)
+        else:
+            body = json.dumps({"error": True, "reason": REASONS[status].decode()}).encode()
+            if status == 429:
+                headers += f"Retry-After: {self.retry_after:g}\r\n".encode()
+        writer.write(
+            b"HTTP/1.1 " + str(status).encode() + b" " + REASONS[status] + b"\r\n"
+            + headers
+            + b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+        )
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "connection" and value.strip().lower() == "close":
+                        keep_alive = False
+                self.requests += 1
+                target = request_line.split()[1].decode()
+                await self.respond(writer, parse_qs(urlsplit(target).query))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+
+@contextmanager
+def running(**kwargs) -> Iterator[StubUpstream]:
+    """Заглушка в отдельном потоке со своим event loop — для синхронных тестов и TestClient."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name="stub-upstream", daemon=True)
+    thread.start()
+    stub = asyncio.run_coroutine_threadsafe(StubUpstream(**kwargs).start(), loop).result()
+    try:
+        yield stub
+    finally:
+        asyncio.run_coroutine_threadsafe(stub.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="доля очень медленных ответов")
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+
+
+def options(args: argparse.Namespace) -> dict:
+    return {
+        "latency": args.latency_ms / 1000,
+        "jitter": args.jitter_ms / 1000,
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "retry_after": args.retry_after,
+        "slow_rate": args.slow_rate,
+        "slow_latency": args.slow_ms / 1000,
+    }
+
+
+async def _serve(port: int, **kwargs) -> None:
+    stub = await StubUpstream(port=port, **kwargs).start()
+    print(f"stub upstream on {stub.url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.port, **options(args)))
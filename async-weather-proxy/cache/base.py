@@ -0,0 +1,179 @@
+# app/cache/base.py
+import asyncio
+import heapq
+import itertools
+import time
+from abc import ABC, abstractmethod
+from operator import itemgetter
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import orjson
+
+from cache.keys import parse_key
+
+
+class Entry:
+    """
+    Запись кэша с мягким и жёстким TTL (время — time.monotonic()).
+
+    До fresh_until запись свежая; между fresh_until и expires_at её ещё можно
+    отдать (stale-while-revalidate); после expires_at её удаляет sweeper.
+    """
+
+    __slots__ = ("data", "fresh_until", "expires_at", "size", "hits", "body", "recheck_at")
+
+    def __init__(self, data: Any, fresh_until: float, expires_at: float, size: int = 0, body: Optional[bytes] = None):
+        self.data = data
+        self.fresh_until = fresh_until
+        self.expires_at = expires_at
+        self.size = size
+        self.hits = 0  # попаданий с момента последней записи
+        self.body = body  # data, уже сериализованные в JSON (считаются один раз)
+        self.recheck_at = float("inf")  # для копии в L1: когда перечитать общий L2
+
+    def encoded(self) -> bytes:
+        """JSON-байты data; для хитов кэша сериализация выполняется один раз на запись."""
+        if self.body is None:
+            self.body = self.data if isinstance(self.data, bytes) else orjson.dumps(self.data)
+        return self.body
+
+    def decoded(self) -> Any:
+        """data; запись из снимка хранит сырые JSON-байты до первого обращения."""
+        if isinstance(self.data, bytes):
+            self.body = self.data
+            self.data = orjson.loads(self.data)
+        return self.data
+
+    def is_stale(self, now: float) -> bool:
+        return self.fresh_until <= now
+
+    def ttls(self, now: float) -> tuple[float, float]:
+        """Оставшиеся (мягкий TTL, stale-окно) — чтобы переложить запись в другой кэш."""
+        fresh = max(self.fresh_until - now, 0.0)
+        return fresh, max(self.expires_at - now, 0.0) - fresh
+
+
+class CacheQuery:
+    """
+    Фильтр листинга кэша. Units, префикс и bbox проверяются по ключу, без
+    декодирования данных; TTL — по оставшемуся мягкому TTL записи (у stale он 0).
+    """
+
+    __slots__ = ("units", "prefix", "bbox", "min_ttl", "max_ttl")
+
+    def __init__(
+        self,
+        units: Optional[str] = None,
+        prefix: str = "",
+        bbox: Optional[tuple[float, float, float, float]] = None,  # min_lat, min_lon, max_lat, max_lon
+        min_ttl: Optional[float] = None,
+        max_ttl: Optional[float] = None,
+    ):
+        self.units = units
+        self.prefix = prefix
+        self.bbox = bbox
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+
+    def match_key(self, key: str) -> bool:
+        if not key.startswith(self.prefix):
+            return False
+        if self.units is None and self.bbox is None:
+            return True
+        parsed = parse_key(key)
+        if parsed is None:
+            return False
+        lat, lon, units = parsed
+        if self.units is not None and units != self.units:
+            return False
+        if self.bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = self.bbox
+            return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+        return True
+
+    def match_entry(self, entry: Entry, now: float) -> bool:
+        if entry.expires_at < now:
+            return False
+        remaining = max(entry.fresh_until - now, 0.0)
+        if self.min_ttl is not None and remaining < self.min_ttl:
+            return False
+        return self.max_ttl is None or remaining <= self.max_ttl
+
+
+class CacheBackend(ABC):
+    """Интерфейс кэша, от которого зависит main.py."""
+
+    @abstractmethod
+    async def get_entry(self, key: str) -> Optional[Entry]:
+        """Запись целиком, если она ещё не вышла за жёсткий TTL (может быть stale)."""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl_sec: float = 300, stale_ttl_sec: float = 0) -> None:
+        ...
+
+    async def peek(self, key: str) -> Optional[Entry]:
+        """
+        Запись без побочных эффектов для фоновых задач (прогрев) и просмотра
+        через /cache/weather/{key}: не считается попаданием и не двигает LRU.
+        По умолчанию — обычный get_entry.
+        """
+        return await self.get_entry(key)
+
+    @abstractmethod
+    def iter_entries(self, query: Optional[CacheQuery] = None) -> AsyncIterator[List[tuple[str, Entry]]]:
+        """
+        Живые записи, подходящие под фильтр, порциями (key, Entry); между порциями
+        event loop свободен. Порядок зависит от бэкенда.
+        """
+
+    async def scan(
+        self, query: Optional[CacheQuery] = None, after: Optional[str] = None, limit: int = 100
+    ) -> List[tuple[str, Entry]]:
+        """
+        Страница записей в порядке ключа, строго после курсора after.
+        Общая реализация проходит все записи и держит только limit наименьших ключей;
+        бэкенды с индексом по ключу переопределяют её.
+        """
+        page: List[tuple[str, Entry]] = []
+        async for batch in self.iter_entries(query):
+            candidates = (kv for kv in batch if after is None or kv[0] > after)
+            page = heapq.nsmallest(limit, itertools.chain(page, candidates), key=itemgetter(0))
+        return page
+
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Удалить записи за жёстким TTL, вернуть их количество."""
+
+    async def get(self, key: str):
+        """Только свежие данные (без stale)."""
+        entry = await self.get_entry(key)
+        if entry is None or entry.is_stale(time.monotonic()):
+            return None
+        return entry.data
+
+    async def close(self) -> None:
+        pass
+
+    async def _sweep_forever(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.sweep()
+
+    def start_sweeper(self, interval: float = 30.0) -> asyncio.Task:
+        """Запустить фоновую очистку (из lifespan приложения)."""
+        return asyncio.create_task(self._sweep_forever(interval))
+
+    async def stop_sweeper(self, task: asyncio.Task) -> None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
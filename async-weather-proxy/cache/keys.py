@@ -0,0 +1,47 @@
+# app/cache/keys.py
+import math
+import os
+from typing import Optional
+
+# Размер ячейки сетки в км: все координаты внутри одной ячейки делят один запрос к апстриму.
+# 0 — старое поведение: округление до 4 знаков (~11 м).
+GRID_KM = float(os.getenv("CACHE_GRID_KM", "1.0"))
+
+KM_PER_DEGREE = 111.32
+
+
+def cell_of(lat: float, lon: float, km: float = None) -> tuple[float, float]:
+    """
+    Центр ячейки, в которую попадает точка.
+
+    Шаг по широте постоянный; шаг по долготе растёт к полюсам, чтобы ячейка
+    оставалась примерно km × km.
+    """
+    km = GRID_KM if km is None else km
+    if km <= 0:
+        return round(lat, 4), round(lon, 4)
+    lat_step = km / KM_PER_DEGREE
+    row = math.floor((lat + 90) / lat_step)
+    clat = min(-90 + (row + 0.5) * lat_step, 90.0)
+    lon_step = min(km / (KM_PER_DEGREE * max(math.cos(math.radians(clat)), 1e-6)), 360.0)
+    col = math.floor((lon + 180) / lon_step)
+    clon = min(-180 + (col + 0.5) * lon_step, 180.0)
+    return round(clat, 5), round(clon, 5)
+
+
+def cell_key(cell: tuple[float, float], units: str, kind: str = "w") -> str:
+    """kind: w — текущая погода, f — почасовой прогноз."""
+    return f"{kind}:{cell[0]}:{cell[1]}:{units}"
+
+
+def make_key(lat: float, lon: float, units: str) -> str:
+    return cell_key(cell_of(lat, lon), units)
+
+
+def parse_key(key: str) -> Optional[tuple[float, float, str]]:
+    """(lat, lon, units) центра ячейки из ключа cell_key; None для ключей другого вида."""
+    try:
+        _, lat, lon, units = key.split(":")
+        return float(lat), float(lon), units
+    except ValueError:
+        return None
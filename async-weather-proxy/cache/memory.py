@@ -1,53 +1,149 @@
 # app/cache/memory.py
+import os
+import sys
 import time
 import asyncio
-from typing import Any, List, Dict
+from collections import OrderedDict
+from typing import Any, AsyncIterator, List, Dict, Optional
 
-_lock = asyncio.Lock()
-_store: dict[str, tuple[float, Any]] = {}  # key -> (expires_at, data)
+from cache.base import CacheBackend, CacheQuery, Entry
+from cache.keys import make_key  # noqa: F401  (для старых импортов)
 
-def make_key(lat: float, lon: float, units: str) -> str:
-    return f"w:{round(lat, 4)}:{round(lon, 4)}:{units}"
+# Лимиты: 0 = без ограничения
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "100000"))
+MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
 
-async def get(key: str):
-    now = time.monotonic()
-    async with _lock:
-        item = _store.get(key)
-        if not item:
+SWEEP_BATCH = 1000  # ключей за один проход между уступками event loop
+
+
+def _approx_size(key: str, value: Any) -> int:
+    """Грубая оценка памяти под запись: ключ, контейнер и его значения."""
+    size = sys.getsizeof(key) + sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += sys.getsizeof(k) + sys.getsizeof(v)
+    return size
+
+
+class MemoryCache(CacheBackend):
+    """
+    Кэш в памяти процесса с LRU-вытеснением.
+
+    Блокировки нет: все операции — синхронная работа со словарём без await внутри,
+    поэтому в одном event loop они атомарны относительно других корутин.
+    Порядок OrderedDict = порядок LRU: в начале самые давно использованные.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self._store: "OrderedDict[str, Entry]" = OrderedDict()
+        self._bytes = 0
+        self._counters = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self.configure(max_entries, max_bytes)
+
+    def configure(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES) -> None:
+        """Поменять лимиты кэша (лишнее вытесняется при следующей записи)."""
+        self.max_entries, self.max_bytes = max_entries, max_bytes
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def _pop(self, key: str) -> None:
+        entry = self._store.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._store and (
+            (self.max_entries and len(self._store) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            self._pop(next(iter(self._store)))
+            self._counters["evictions"] += 1
+
+    async def get_entry(self, key: str) -> Optional[Entry]:
+        entry = self._store.get(key)
+        now = time.monotonic()
+        if entry is None or entry.expires_at < now:
+            # протухшие записи удаляет фоновый sweeper, здесь просто промах
+            self._counters["misses"] += 1
             return None
-        expires_at, data = item
-        if expires_at < now:
-            _store.pop(key, None)
+        self._store.move_to_end(key)
+        # запись из снимка декодируется лениво, а сырые байты сразу годятся для ответа
+        entry.decoded()
+        entry.hits += 1
+        self._counters["stale_hits" if entry.is_stale(now) else "hits"] += 1
+        return entry
+
+    async def peek(self, key: str) -> Optional[Entry]:
+        entry = self._store.get(key)
+        if entry is None or entry.expires_at < time.monotonic():
             return None
-        return data
-
-async def set(key: str, value: Any, ttl_sec: int = 300):
-    expires_at = time.monotonic() + ttl_sec
-    async with _lock:
-        _store[key] = (expires_at, value)
-
-async def items() -> List[Dict[str, Any]]:
-    """Вернуть все валидные записи кэша (с оставшимся TTL)."""
-    now = time.monotonic()
-    out: List[Dict[str, Any]] = []
-    async with _lock:
-        # лениво выкидываем протухшие и собираем актуальные
-        dead = []
-        for k, (expires_at, data) in _store.items():
-            if expires_at < now:
-                dead.append(k)
-                continue
-            out.append({"key": k, "expires_in": int(expires_at - now), **data})
-        for k in dead:
-            _store.pop(k, None)
-    return out
-
-async def clear() -> None:
-    """Полностью очистить кэш."""
-    async with _lock:
-        _store.clear()
-
-async def stats() -> Dict[str, int]:
-    """Простая статистика по кэшу."""
-    async with _lock:
-        return {"size": len(_store)}
+        return entry
+
+    async def set(self, key: str, value: Any, ttl_sec: float = 300, stale_ttl_sec: float = 0) -> None:
+        now = time.monotonic()
+        self.put(key, Entry(value, now + ttl_sec, now + ttl_sec + stale_ttl_sec, _approx_size(key, value)))
+
+    def put(self, key: str, entry: Entry) -> None:
+        """Записать готовую Entry (со своими сроками и счётчиком попаданий)."""
+        if not entry.size:
+            entry.size = _approx_size(key, entry.data)
+        self._pop(key)
+        self._store[key] = entry
+        self._bytes += entry.size
+        self._evict()
+
+    async def iter_entries(self, query: Optional[CacheQuery] = None) -> AsyncIterator[List[tuple[str, Entry]]]:
+        """Порциями по SWEEP_BATCH в порядке LRU; попадания и LRU не трогает."""
+        query = query or CacheQuery()
+        snapshot = list(self._store.items())
+        for i in range(0, len(snapshot), SWEEP_BATCH):
+            now = time.monotonic()
+            batch = [(k, e) for k, e in snapshot[i:i + SWEEP_BATCH] if query.match_key(k) and query.match_entry(e, now)]
+            if batch:
+                yield batch
+            await asyncio.sleep(0)
+
+    def entries(self) -> List[tuple[str, Entry]]:
+        """Снимок (key, Entry) в порядке LRU — для сохранения на диск."""
+        return list(self._store.items())
+
+    def restore(self, key: str, entry: Entry) -> bool:
+        """Вставить запись из снимка, если по ключу ещё ничего нет (живые данные свежее)."""
+        if key in self._store:
+            return False
+        self._store[key] = entry
+        self._bytes += entry.size
+        self._evict()
+        return True
+
+    async def clear(self) -> None:
+        """Полностью очистить кэш."""
+        self._store.clear()
+        self._bytes = 0
+
+    async def stats(self) -> Dict[str, Any]:
+        """Простая статистика по кэшу."""
+        return {
+            "backend": "memory",
+            "size": len(self._store),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            **self._counters,
+        }
+
+    async def sweep(self) -> int:
+        """Удалить протухшие записи порциями, уступая event loop между порциями."""
+        removed = 0
+        keys = list(self._store)
+        for i in range(0, len(keys), SWEEP_BATCH):
+            now = time.monotonic()
+            for k in keys[i:i + SWEEP_BATCH]:
+                entry = self._store.get(k)
+                if entry is not None and entry.expires_at < now:
+                    self._pop(k)
+                    removed += 1
+            await asyncio.sleep(0)
+        self._counters["expired"] += removed
+        return removed
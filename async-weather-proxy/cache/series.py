@@ -0,0 +1,69 @@
+# app/cache/series.py
+"""
+Почасовой прогноз в колоночном виде.
+
+Список dict'ов на каждый час — это объект float (24 байта) плюс указатель и ключ
+на каждое значение. Здесь время — один array('q') с unix-секундами, а каждая
+переменная — свой array('f'), 4 байта на значение. Отсутствующие значения — NaN
+(orjson отдаёт их как null).
+"""
+import math
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Mapping, Optional, Sequence
+
+NAN = float("nan")
+
+
+def _epoch(local_iso: str, utc_offset: int) -> int:
+    # Open-Meteo при timezone=auto отдаёт локальное время без смещения; смещение приходит отдельно
+    return int(datetime.fromisoformat(local_iso).replace(tzinfo=timezone.utc).timestamp()) - utc_offset
+
+
+class HourlySeries:
+    __slots__ = ("times", "columns")
+
+    def __init__(self, times: array, columns: Dict[str, array]):
+        self.times = times
+        self.columns = columns
+
+    @classmethod
+    def from_open_meteo(cls, hourly: Mapping[str, Sequence], names: Mapping[str, str], utc_offset: int = 0) -> "HourlySeries":
+        """hourly-блок ответа Open-Meteo -> колонки; names: наше имя -> имя переменной Open-Meteo."""
+        times = array("q", (_epoch(t, utc_offset) for t in hourly.get("time") or ()))
+        columns = {}
+        for name, source in names.items():
+            values = hourly.get(source)
+            if values is None:
+                continue
+            columns[name] = array("f", (NAN if v is None else v for v in values))
+        return cls(times, columns)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def __sizeof__(self) -> int:
+        # для лимита MemoryCache по байтам: буферы массивов, а не только сам объект
+        return object.__sizeof__(self) + sys.getsizeof(self.times) + sum(sys.getsizeof(c) for c in self.columns.values())
+
+    def window(self, start: int, end: int) -> tuple[int, int]:
+        """Индексы [i, j) часов с start <= time < end."""
+        return bisect_left(self.times, start), bisect_left(self.times, end)
+
+    def slice(
+        self, start: int, end: int, variables: Optional[Iterable[str]] = None
+    ) -> tuple[memoryview, Dict[str, memoryview]]:
+        """
+        Срез по времени и переменным без копирования: memoryview смотрят в буферы
+        серии, копируется только то, что потом уходит в ответ.
+        """
+        i, j = self.window(start, end)
+        names = self.columns if variables is None else [v for v in variables if v in self.columns]
+        return memoryview(self.times)[i:j], {name: memoryview(self.columns[name])[i:j] for name in names}
+
+
+def rounded(values: memoryview, ndigits: int = 3) -> list:
+    """float32 -> короткие float для JSON (3.4, а не 3.4000000953674316); NaN остаётся NaN."""
+    return [v if math.isnan(v) else round(v, ndigits) for v in values]
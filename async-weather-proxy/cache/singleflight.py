@@ -0,0 +1,82 @@
+# app/cache/singleflight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class SingleFlight:
+    """
+    Дедупликация одновременных промахов по одному ключу.
+
+    Первый промах запускает загрузку отдельной задачей, остальные ждут
+    ту же задачу; результат или исключение получают все ожидающие.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.started = 0    # сколько загрузок реально ушло в апстрим
+        self.coalesced = 0  # сколько запросов присоединились к чужой загрузке
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._inflight
+
+    def start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Запустить загрузку, если по ключу ещё ничего не летит (без ожидания)."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self.started += 1
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        return task
+
+    def join(self, key: str) -> Optional[asyncio.Task]:
+        """
+        Уже идущая загрузка по ключу (считается как coalesced) или None.
+        Присоединившийся считается ожидающим, пока не вызовет leave(key).
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+        return task
+
+    def leave(self, key: str) -> None:
+        """Парный вызов к join(): результат загрузки этому ожидающему больше не нужен."""
+        left = self._waiters[key] - 1
+        if left:
+            self._waiters[key] = left
+        else:
+            del self._waiters[key]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if key in self._inflight:
+            self.coalesced += 1
+        task = self.start(key, fn)
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # shield: отмена одного клиента не должна отменять загрузку для остальных
+            return await asyncio.shield(task)
+        finally:
+            self.leave(key)
+
+    def waiters(self, key: str) -> int:
+        """Сколько запросов ждут загрузку: через do() или join() без leave()."""
+        return self._waiters.get(key, 0)
+
+    def cancel(self, key: str) -> None:
+        task = self._inflight.get(key)
+        if task is not None:
+            task.cancel()
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # помечаем исключение как полученное, даже если ждать было некому
+
+    def stats(self) -> Dict[str, int]:
+        return {"inflight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
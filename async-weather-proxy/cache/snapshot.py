@@ -0,0 +1,107 @@
+# app/cache/snapshot.py
+"""
+Снимок MemoryCache на диск, чтобы рестарт не начинался с пустого кэша.
+
+Формат (little-endian):
+    header: b"WCS1" | count: u32 | saved_at: f64
+    record: fresh_until: f64 | expires_at: f64 | key_len: u16 | data_len: u32 | key | data(JSON, orjson)
+
+Времена в файле — wall clock (time.time()): monotonic-часы не переживают
+перезапуск процесса, поэтому при записи и чтении они пересчитываются.
+"""
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Iterator, Tuple
+
+from cache.base import Entry
+from cache.memory import MemoryCache, _approx_size
+
+MAGIC = b"WCS1"
+_HEADER = struct.Struct("<4sId")
+_RECORD = struct.Struct("<ddHI")
+
+LOAD_BATCH = 2000  # записей за один шаг загрузки между уступками event loop
+
+# Отмена save() не останавливает поток записи: следующий save (например, финальный
+# в lifespan) дожидается его здесь, а не пишет тот же файл параллельно.
+_write_lock = threading.Lock()
+
+
+def _write(path: str, records: list[Tuple[str, Entry]], mono_now: float, wall_now: float) -> int:
+    with _write_lock:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            return _write_file(path, tmp, records, mono_now, wall_now)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+
+def _write_file(path: str, tmp: str, records: list[Tuple[str, Entry]], mono_now: float, wall_now: float) -> int:
+    shift = wall_now - mono_now
+    count = 0
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, 0, wall_now))
+        for key, entry in records:
+            if entry.expires_at < mono_now:
+                continue
+            k = key.encode()
+            data = entry.encoded()
+            f.write(_RECORD.pack(entry.fresh_until + shift, entry.expires_at + shift, len(k), len(data)))
+            f.write(k)
+            f.write(data)
+            count += 1
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, count, wall_now))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)  # атомарно: читатель видит либо старый, либо новый снимок
+    return count
+
+
+async def save(cache: MemoryCache, path: str) -> int:
+    """Сохранить живые записи; сериализация идёт в отдельном потоке."""
+    records = list(cache.entries())  # снимок ссылок — один шаг без await
+    return await asyncio.to_thread(_write, path, records, time.monotonic(), time.time())
+
+
+def _read(path: str) -> Iterator[Tuple[str, bytes, float, float]]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, count, _ = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a weather cache snapshot")
+        pos = _HEADER.size
+        for _ in range(count):
+            fresh_until, expires_at, key_len, data_len = _RECORD.unpack_from(mm, pos)
+            pos += _RECORD.size
+            key = mm[pos:pos + key_len].decode()
+            pos += key_len
+            data = mm[pos:pos + data_len]
+            pos += data_len
+            yield key, data, fresh_until, expires_at
+
+
+async def load(cache: MemoryCache, path: str) -> int:
+    """
+    Загрузить снимок порциями, не блокируя event loop: воркер обслуживает
+    запросы с первой секунды, а кэш наполняется в фоне. Значения остаются
+    сырыми JSON-байтами и декодируются при первом обращении к ключу.
+    Записи, уже появившиеся в кэше за время загрузки, свежее снимка и не перезаписываются.
+    """
+    if not os.path.exists(path):
+        return 0
+    loaded = 0
+    wall_now, mono_now = time.time(), time.monotonic()
+    shift = mono_now - wall_now
+    for i, (key, data, fresh_until, expires_at) in enumerate(_read(path), 1):
+        if expires_at > wall_now:
+            entry = Entry(data, fresh_until + shift, expires_at + shift, _approx_size(key, data))
+            loaded += cache.restore(key, entry)
+        if i % LOAD_BATCH == 0:
+            await asyncio.sleep(0)
+    return loaded
@@ -0,0 +1,242 @@
+# app/cache/sqlite.py
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import orjson
+
+from cache.base import CacheBackend, CacheQuery, Entry
+
+MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "1000000"))
+SCAN_BATCH = 1000  # строк за один запрос листинга (keyset по первичному ключу)
+HITS_TRACKED = 100_000  # ключей со счётчиком попаданий в процессе; при переполнении счётчики сбрасываются
+SWEEP_BATCH = 1000  # строк за один DELETE при чистке: не держим блокировку записи файла подолгу
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS weather_cache (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    fresh_until REAL NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS weather_cache_expires ON weather_cache (expires_at);
+"""
+
+# Число строк ведут триггеры: stats() читает одну строку вместо COUNT(*) по всей
+# таблице, и счётчик общий для всех воркеров. Запись идёт через UPSERT, а не
+# INSERT OR REPLACE: у REPLACE удаление строки триггеры не видят.
+_SIZE_SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS weather_cache_size (n INTEGER NOT NULL);
+INSERT INTO weather_cache_size SELECT COUNT(*) FROM weather_cache
+    WHERE NOT EXISTS (SELECT 1 FROM weather_cache_size);
+CREATE TRIGGER IF NOT EXISTS weather_cache_size_insert AFTER INSERT ON weather_cache
+    BEGIN UPDATE weather_cache_size SET n = n + 1; END;
+CREATE TRIGGER IF NOT EXISTS weather_cache_size_delete AFTER DELETE ON weather_cache
+    BEGIN UPDATE weather_cache_size SET n = n - 1; END;
+COMMIT;
+"""
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Общий кэш для нескольких воркеров uvicorn: один SQLite-файл в режиме WAL.
+
+    Времена в файле — wall clock (time.time()), т.к. monotonic у каждого
+    процесса свой; наружу отдаются Entry с monotonic-временами.
+    Запросы выполняются в потоках (asyncio.to_thread): даже короткий поиск по
+    ключу может ждать блокировку файла до busy_timeout, а event loop в это
+    время должен обслуживать остальные запросы. Соединение одно, поэтому
+    обращения к нему идут по очереди под self._lock.
+    """
+
+    def __init__(self, path: str, max_entries: int = MAX_ENTRIES, busy_timeout: float = 0.5):
+        self.path = path
+        self.max_entries = max_entries
+        self._db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.executescript(_SIZE_SCHEMA)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "stale_hits": 0, "misses": 0, "expired": 0, "errors": 0}
+        # key -> (fresh_until записи в файле, попаданий): Entry собирается заново на
+        # каждый поиск, а refresh-ahead нужен счётчик, живущий до следующей записи
+        self._hits: Dict[str, tuple[float, int]] = {}
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.to_thread(self._locked, fn, *args)
+
+    def _locked(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            return fn(*args)
+
+    def _fetchall(self, sql: str, params: tuple = ()) -> List[tuple]:
+        return self._db.execute(sql, params).fetchall()
+
+    def _select(self, key: str) -> Optional[tuple[str, float, float]]:
+        try:
+            row = self._db.execute(
+                "SELECT data, fresh_until, expires_at FROM weather_cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # файл занят другим воркером дольше busy_timeout — считаем промахом
+            self._counters["errors"] += 1
+            return None
+        if row is None or row[2] < time.time():
+            return None
+        return row
+
+    async def _row(self, key: str) -> Optional[tuple[str, float, float]]:
+        return await self._run(self._select, key)
+
+    async def get_entry(self, key: str) -> Optional[Entry]:
+        row = await self._row(key)
+        if row is None:
+            self._counters["misses"] += 1
+            return None
+        data, fresh_until, expires_at = row
+        entry = self._entry(data, fresh_until, expires_at, time.monotonic() - time.time())
+        seen = self._hits.get(key)
+        # другой fresh_until — запись перезаписана (в том числе другим воркером), счёт заново
+        entry.hits = seen[1] + 1 if seen is not None and seen[0] == fresh_until else 1
+        if len(self._hits) >= HITS_TRACKED and seen is None:
+            self._hits.clear()
+        self._hits[key] = (fresh_until, entry.hits)
+        self._counters["stale_hits" if entry.is_stale(time.monotonic()) else "hits"] += 1
+        return entry
+
+    async def peek(self, key: str) -> Optional[Entry]:
+        row = await self._row(key)
+        if row is None:
+            return None
+        data, fresh_until, expires_at = row
+        return self._entry(data, fresh_until, expires_at, time.monotonic() - time.time())
+
+    @staticmethod
+    def _entry(data: str, fresh_until: float, expires_at: float, shift: float) -> Entry:
+        return Entry(orjson.loads(data), fresh_until + shift, expires_at + shift, len(data), body=data.encode())
+
+    async def set(self, key: str, value: Any, ttl_sec: float = 300, stale_ttl_sec: float = 0) -> None:
+        self._hits.pop(key, None)
+        wall = time.time()
+        await self._run(self._upsert, key, orjson.dumps(value).decode(), wall + ttl_sec, wall + ttl_sec + stale_ttl_sec)
+
+    def _upsert(self, key: str, data: str, fresh_until: float, expires_at: float) -> None:
+        try:
+            self._db.execute(
+                "INSERT INTO weather_cache (key, data, fresh_until, expires_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET"
+                " data = excluded.data, fresh_until = excluded.fresh_until, expires_at = excluded.expires_at",
+                (key, data, fresh_until, expires_at),
+            )
+        except sqlite3.OperationalError:
+            self._counters["errors"] += 1
+
+    async def iter_entries(self, query: Optional[CacheQuery] = None) -> AsyncIterator[List[tuple[str, Entry]]]:
+        """Порциями по SCAN_BATCH в порядке ключа."""
+        async for batch in self._batches(query or CacheQuery(), ""):
+            yield batch
+
+    async def _batches(self, query: CacheQuery, after: str) -> AsyncIterator[List[tuple[str, Entry]]]:
+        # каждая порция — отдельный запрос key > последний ключ: между порциями не висит открытый курсор
+        while True:
+            wall = time.time()
+            rows = await self._run(
+                self._fetchall,
+                "SELECT key, data, fresh_until, expires_at FROM weather_cache"
+                " WHERE key > ? AND key >= ? AND expires_at >= ? ORDER BY key LIMIT ?",
+                (after, query.prefix, wall, SCAN_BATCH),
+            )
+            if not rows:
+                return
+            now = time.monotonic()
+            batch = []
+            for key, data, fresh_until, expires_at in rows:
+                if not key.startswith(query.prefix):
+                    # ключи отсортированы: дальше префикс уже не встретится
+                    if batch:
+                        yield batch
+                    return
+                if query.match_key(key):
+                    shift = now - wall
+                    # данные остаются байтами до Entry.decoded(): отфильтрованное по TTL не декодируется
+                    entry = Entry(data.encode(), fresh_until + shift, expires_at + shift, len(data))
+                    if query.match_entry(entry, now):
+                        batch.append((key, entry))
+            if batch:
+                yield batch
+            after = rows[-1][0]
+
+    async def scan(
+        self, query: Optional[CacheQuery] = None, after: Optional[str] = None, limit: int = 100
+    ) -> List[tuple[str, Entry]]:
+        """Страница по индексу первичного ключа: читается только окрестность курсора."""
+        page: List[tuple[str, Entry]] = []
+        batches = self._batches(query or CacheQuery(), after or "")
+        try:
+            async for batch in batches:
+                page.extend(batch)
+                if len(page) >= limit:
+                    break
+        finally:
+            await batches.aclose()
+        return page[:limit]
+
+    async def clear(self) -> None:
+        await self._run(self._fetchall, "DELETE FROM weather_cache")
+        self._hits.clear()
+
+    def _size(self) -> int:
+        return self._db.execute("SELECT n FROM weather_cache_size").fetchone()[0]
+
+    async def stats(self) -> Dict[str, Any]:
+        size = await self._run(self._size)
+        return {"backend": "sqlite", "path": self.path, "size": size, "max_entries": self.max_entries, **self._counters}
+
+    def _delete_batch(self, sql: str, params: tuple) -> int:
+        try:
+            return self._db.execute(sql, params).rowcount
+        except sqlite3.OperationalError:
+            self._counters["errors"] += 1
+            return 0
+
+    async def _delete_in_batches(self, sql: str, params: tuple, limit: Optional[int] = None) -> int:
+        """sql удаляет не больше SWEEP_BATCH строк (последний параметр — LIMIT); повторять, пока есть что удалять."""
+        removed = 0
+        while limit is None or removed < limit:
+            batch = SWEEP_BATCH if limit is None else min(SWEEP_BATCH, limit - removed)
+            n = await self._run(self._delete_batch, sql, (*params, batch))
+            removed += n
+            if n < batch:
+                break
+        return removed
+
+    async def sweep(self) -> int:
+        """
+        Удалить протухшие записи и обрезать файл до max_entries (первыми уходят
+        ближайшие к истечению). Удаляет порциями по SWEEP_BATCH: каждая порция —
+        короткая транзакция, и другие воркеры не ждут одну большую.
+        """
+        removed = await self._delete_in_batches(
+            "DELETE FROM weather_cache WHERE key IN ("
+            " SELECT key FROM weather_cache WHERE expires_at < ? LIMIT ?)",
+            (time.time(),),
+        )
+        self._counters["expired"] += removed
+        if self.max_entries:
+            excess = await self._run(self._size) - self.max_entries
+            if excess > 0:
+                await self._delete_in_batches(
+                    "DELETE FROM weather_cache WHERE key IN ("
+                    " SELECT key FROM weather_cache ORDER BY expires_at LIMIT ?)",
+                    (),
+                    excess,
+                )
+        return removed
+
+    async def close(self) -> None:
+        await self._run(self._db.close)
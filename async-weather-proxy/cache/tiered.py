@@ -0,0 +1,83 @@
+# app/cache/tiered.py
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from cache.base import CacheBackend, CacheQuery, Entry
+from cache.memory import MemoryCache
+
+# Сколько L1 может верить своей копии, прежде чем перечитать общий L2:
+# ограничивает расхождение между воркерами после обновления ключа другим процессом.
+L1_TTL = float(os.getenv("CACHE_L1_TTL", "30"))
+
+
+class TieredCache(CacheBackend):
+    """
+    Двухуровневый кэш: L1 в процессе перед общим L2.
+
+    Копия в L1 хранит сроки записи из L2 (по ним main решает про refresh-ahead),
+    а через l1_ttl перечитывается из L2 (recheck_at); счётчик попаданий при этом
+    переносится, если в L2 всё та же запись.
+    """
+
+    def __init__(self, l1: MemoryCache, l2: CacheBackend, l1_ttl: float = L1_TTL):
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_ttl = l1_ttl
+
+    def _fill_l1(self, key: str, entry: Entry, now: float) -> None:
+        copy = Entry(entry.data, entry.fresh_until, entry.expires_at, entry.size, body=entry.body)
+        copy.hits = entry.hits
+        copy.recheck_at = now + self.l1_ttl
+        self.l1.put(key, copy)
+
+    async def get_entry(self, key: str) -> Optional[Entry]:
+        now = time.monotonic()
+        entry = await self.l1.get_entry(key)
+        if entry is not None and not entry.is_stale(now) and now < entry.recheck_at:
+            return entry
+        shared = await self.l2.get_entry(key)
+        if shared is None:
+            return None
+        if entry is not None and entry.encoded() == shared.encoded():
+            # та же запись: попадания, обслуженные из L1, продолжают считаться
+            shared.hits = max(shared.hits, entry.hits + 1)
+        if not shared.is_stale(now):
+            self._fill_l1(key, shared, now)
+        return shared
+
+    async def peek(self, key: str) -> Optional[Entry]:
+        # срок жизни определяет общий L2, L1 — лишь его короткая копия
+        return await self.l2.peek(key)
+
+    async def set(self, key: str, value: Any, ttl_sec: float = 300, stale_ttl_sec: float = 0) -> None:
+        await self.l2.set(key, value, ttl_sec=ttl_sec, stale_ttl_sec=stale_ttl_sec)
+        now = time.monotonic()
+        entry = Entry(value, now + ttl_sec, now + ttl_sec + stale_ttl_sec)
+        entry.recheck_at = now + self.l1_ttl
+        self.l1.put(key, entry)
+
+    async def iter_entries(self, query: Optional[CacheQuery] = None) -> AsyncIterator[List[tuple[str, Entry]]]:
+        async for batch in self.l2.iter_entries(query):
+            yield batch
+
+    async def scan(
+        self, query: Optional[CacheQuery] = None, after: Optional[str] = None, limit: int = 100
+    ) -> List[tuple[str, Entry]]:
+        return await self.l2.scan(query, after, limit)
+
+    async def clear(self) -> None:
+        await asyncio.gather(self.l1.clear(), self.l2.clear())
+
+    async def stats(self) -> Dict[str, Any]:
+        l1, l2 = await asyncio.gather(self.l1.stats(), self.l2.stats())
+        return {"backend": "tiered", "size": l2.get("size", 0), "l1": l1, "l2": l2}
+
+    async def sweep(self) -> int:
+        removed = await self.l1.sweep()
+        return removed + await self.l2.sweep()
+
+    async def close(self) -> None:
+        await self.l1.close()
+        await self.l2.close()
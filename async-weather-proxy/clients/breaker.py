@@ -0,0 +1,94 @@
+import os
+import time
+from collections import deque
+
+FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Апстрим считается недоступным — запрос даже не отправляется."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("upstream circuit is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Предохранитель перед апстримом.
+
+    closed    — запросы идут, подряд идущие ошибки считаются;
+    open      — после failure_threshold ошибок подряд запросы сразу падают
+                с CircuitOpenError в течение reset_timeout;
+    half_open — пропускается одна пробная попытка: успех закрывает цепь,
+                ошибка снова открывает.
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0  # ошибок подряд
+        self.rejected = 0  # запросов, отбитых без обращения к апстриму
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+        self.transitions: deque = deque(maxlen=20)
+
+    def _move(self, state: str) -> None:
+        if state != self.state:
+            self.transitions.append({"from": self.state, "to": state, "at": time.time()})
+            self.state = state
+
+    def retry_after(self) -> float:
+        return max(self._opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def check(self) -> None:
+        """Вызывается перед каждой попыткой; бросает CircuitOpenError, если попытку делать нельзя."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(self.retry_after())
+            self._move(HALF_OPEN)
+            self._probe_at = now
+            return
+        if self.state == HALF_OPEN:
+            # одна проба за раз; если проба пропала (отмена), через reset_timeout пускаем следующую
+            if now - self._probe_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(self.reset_timeout - (now - self._probe_at))
+            self._probe_at = now
+
+    def release_probe(self) -> None:
+        """
+        Проба закончилась без вердикта (отмена, наш таймаут, 429 на последней попытке):
+        освободить слот, чтобы следующий check() сразу пустил новую пробу.
+        """
+        if self.state == HALF_OPEN:
+            self._probe_at = float("-inf")
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._move(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._move(OPEN)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN and self.retry_after() > 0
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 3) if self.state == OPEN else 0.0,
+            "transitions": list(self.transitions),
+        }
@@ -0,0 +1,77 @@
+import os
+from collections import deque
+
+from metrics import UPSTREAM_HEDGES
+
+HEDGE_ENABLED = os.getenv("UPSTREAM_HEDGE", "1") == "1"
+HEDGE_QUANTILE = float(os.getenv("UPSTREAM_HEDGE_QUANTILE", "0.95"))
+HEDGE_BUDGET = float(os.getenv("UPSTREAM_HEDGE_BUDGET", "0.1"))  # хеджей на один основной запрос, в среднем
+HEDGE_WINDOW = 500  # последних латентностей для перцентиля
+HEDGE_MIN_SAMPLES = 20  # пока данных меньше — задержка по умолчанию
+HEDGE_DEFAULT_DELAY = 1.0
+HEDGE_MIN_DELAY = 0.02  # не хеджировать раньше: быстрые ответы дублировать незачем
+HEDGE_MAX_TOKENS = 10.0  # сколько хеджей можно накопить для всплеска медленных ответов
+
+
+class Hedger:
+    """
+    Когда запускать второй (хеджирующий) запрос и можно ли.
+
+    Задержка — скользящий перцентиль латентности успешных ответов: хедж уходит
+    только для ~5% самых медленных запросов. Бюджет — token bucket: каждый
+    основной запрос добавляет budget токена, хедж тратит один, так что хеджей
+    не больше budget от числа запросов даже при массовой деградации апстрима.
+    """
+
+    def __init__(
+        self,
+        quantile: float = HEDGE_QUANTILE,
+        budget: float = HEDGE_BUDGET,
+        window: int = HEDGE_WINDOW,
+        enabled: bool = HEDGE_ENABLED,
+    ):
+        self.quantile = quantile
+        self.budget = budget
+        self.enabled = enabled
+        self._latencies: deque = deque(maxlen=window)
+        self._delay = None
+        self._tokens = 0.0
+        self.counters = {"fired": 0, "won": 0, "no_budget": 0, "no_capacity": 0}
+
+    def observe(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self._delay = None
+
+    def delay(self) -> float:
+        """Через сколько секунд без ответа запускать хедж."""
+        if self._delay is None:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                self._delay = HEDGE_DEFAULT_DELAY
+            else:
+                ordered = sorted(self._latencies)
+                self._delay = ordered[min(int(len(ordered) * self.quantile), len(ordered) - 1)]
+        return max(self._delay, HEDGE_MIN_DELAY)
+
+    def on_request(self) -> None:
+        self._tokens = min(self._tokens + self.budget, HEDGE_MAX_TOKENS)
+
+    def allow(self) -> bool:
+        if self._tokens < 1:
+            self.record("no_budget")
+            return False
+        self._tokens -= 1
+        return True
+
+    def record(self, result: str) -> None:
+        """fired | won | no_budget | no_capacity"""
+        self.counters[result] += 1
+        UPSTREAM_HEDGES.inc(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "delay": round(self.delay(), 4),
+            "samples": len(self._latencies),
+            "tokens": round(self._tokens, 2),
+            **self.counters,
+        }
@@ -0,0 +1,148 @@
+import asyncio
+import email.utils
+import os
+import time
+from typing import Optional
+
+from metrics import UPSTREAM_QUEUE_WAIT
+
+MAX_IN_FLIGHT = int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", "20"))
+RATE_PER_SEC = float(os.getenv("UPSTREAM_RPS", "50"))
+BURST = int(os.getenv("UPSTREAM_BURST", "20"))
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Retry-After бывает числом секунд или HTTP-датой."""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+class UpstreamLimiter:
+    """
+    Общий на процесс ограничитель запросов к апстриму.
+
+    - не больше max_in_flight запросов одновременно;
+    - token bucket на rate запросов в секунду (с запасом burst);
+    - на 429 скорость режется вдвое и всё ставится на паузу до Retry-After,
+      после успешных ответов скорость плавно возвращается к исходной (AIMD).
+
+        async with limiter:
+            resp = await client.get(...)
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, rate: float = RATE_PER_SEC, burst: int = BURST):
+        self.max_in_flight = max_in_flight
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self._sem = asyncio.Semaphore(max_in_flight)
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self.in_flight = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._tokens + (now - self._refilled_at) * self.rate, self.burst)
+        self._refilled_at = now
+
+    async def _take_token(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def acquire(self) -> float:
+        """Дождаться слота; вернуть время ожидания в очереди (сек)."""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._sem.acquire()
+            try:
+                await self._take_token()
+            except BaseException:
+                self._sem.release()
+                raise
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        UPSTREAM_QUEUE_WAIT.observe(waited)
+        self.in_flight += 1
+        self.acquired += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        return waited
+
+    async def try_acquire(self) -> bool:
+        """
+        Занять слот, только если он свободен прямо сейчас: без очереди и без ожидания
+        токена (для необязательных запросов вроде хеджа). Незаблокированный семафор
+        захватывается без переключения задач, так что проверка и захват атомарны.
+        """
+        now = time.monotonic()
+        if self._sem.locked() or self.waiting or now < self._paused_until:
+            return False
+        self._refill(now)
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        await self._sem.acquire()
+        self.in_flight += 1
+        self.acquired += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._sem.release()
+
+    async def __aenter__(self) -> "UpstreamLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+    def on_throttled(self, retry_after: float) -> None:
+        """Апстрим ответил 429: мультипликативно снижаем скорость и ставим паузу."""
+        self.throttled += 1
+        self.rate = max(self.rate / 2, self.max_rate / 50)
+        self._tokens = 0.0
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def on_success(self) -> None:
+        """Аддитивное восстановление скорости после 429."""
+        if self.rate < self.max_rate:
+            self.rate = min(self.rate + self.max_rate / 100, self.max_rate)
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rate": round(self.rate, 3),
+            "max_rate": self.max_rate,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "paused_for": round(max(self._paused_until - time.monotonic(), 0.0), 3),
+            "queue_wait_avg": round(self.wait_total / self.acquired, 6) if self.acquired else 0.0,
+            "queue_wait_max": round(self.wait_max, 6),
+        }
@@ -1,19 +1,253 @@
 import asyncio
+import importlib.util
+import os
 import random
-from typing import Literal
+import time
+from typing import Iterable, List, Literal, Optional, Sequence
 
 import httpx
 
-OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+from clients.breaker import HALF_OPEN, CircuitBreaker, CircuitOpenError
+from clients.hedging import Hedger
+from clients.limiter import UpstreamLimiter, parse_retry_after
+from cache.series import HourlySeries
+from metrics import UPSTREAM_DURATION, UPSTREAM_RETRIES
+
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Настройки пула соединений к апстриму (один клиент на процесс)
+POOL_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+# HTTP/2 включается только если установлен пакет h2 (httpx[http2])
+HTTP2 = os.getenv("UPSTREAM_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+# Бюджет на весь вызов (ожидание limiter, попытки, backoff); каждой попытке — доля остатка
+REQUEST_BUDGET = float(os.getenv("UPSTREAM_REQUEST_BUDGET", "10"))
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "2"))
+ATTEMPTS = 3
+
+_client: Optional[httpx.AsyncClient] = None
+_closed = False  # shutdown() отработал: новый клиент поднимает только startup()
+
+# Общий на процесс: и /weather, и /batch/weather, и фоновые обновления
+limiter = UpstreamLimiter()
+breaker = CircuitBreaker()
+hedger = Hedger()
+
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError)
+
+# Почасовые переменные прогноза: наше имя -> имя в Open-Meteo
+HOURLY_VARIABLES = {
+    "temperature": "temperature_2m",
+    "wind_speed": "wind_speed_10m",
+    "precipitation": "precipitation",
+    "humidity": "relative_humidity_2m",
+}
+
+
+def create_client(
+    max_connections: int = POOL_MAX_CONNECTIONS,
+    max_keepalive: int = POOL_MAX_KEEPALIVE,
+    keepalive_expiry: float = KEEPALIVE_EXPIRY,
+    http2: bool = HTTP2,
+) -> httpx.AsyncClient:
+    """Создать долгоживущий клиент с пулом keep-alive соединений."""
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+    return httpx.AsyncClient(
+        # запасной таймаут; у каждой попытки свой дедлайн из REQUEST_BUDGET
+        timeout=httpx.Timeout(REQUEST_BUDGET, connect=CONNECT_TIMEOUT),
+        headers={"User-Agent": "async-weather-proxy/0.1"},
+        limits=limits,
+        http2=http2,
+    )
+
+
+async def startup(**kwargs) -> httpx.AsyncClient:
+    """Вызывается из lifespan приложения: поднимает общий клиент."""
+    global _client, _closed
+    _closed = False
+    if _client is None:
+        _client = create_client(**kwargs)
+    return _client
+
+
+async def shutdown() -> None:
+    """
+    Закрыть общий клиент и все соединения пула. Запросы, начатые после этого
+    (например, фоновые обновления, пережившие lifespan), получают ошибку,
+    а не новый клиент, который уже никто не закроет.
+    """
+    global _client, _closed
+    _closed = True
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+def get_client() -> httpx.AsyncClient:
+    """Общий клиент; если lifespan не запускался — создаём лениво."""
+    global _client
+    if _closed:
+        raise RuntimeError("upstream client is shut down")
+    if _client is None:
+        _client = create_client()
+    return _client
+
 
 def _units_to_params(units: Literal["metric", "imperial"]) -> dict:
     if units == "imperial":
         return {"temperature_unit": "fahrenheit", "wind_speed_unit": "mph"}
     return {"temperature_unit": "celsius", "wind_speed_unit": "kmh"}
 
-async def fetch_weather(lat: float, lon: float, units: Literal["metric", "imperial"] = "metric") -> dict:
+def _outcome(status: int) -> str:
+    if status == 429:
+        return "throttled"
+    if status >= 500:
+        return "server_error"
+    if status >= 400:
+        return "client_error"
+    return "ok"
+
+def _usable(resp: httpx.Response) -> bool:
+    return resp.status_code != 429 and resp.status_code < 500
+
+async def _exchange(client: httpx.AsyncClient, params: dict, timeout: float) -> httpx.Response:
+    """Один HTTP-обмен с жёстким дедлайном (httpx.Timeout ограничивает только отдельные операции)."""
+    started = time.perf_counter()
+    try:
+        resp = await asyncio.wait_for(
+            client.get(
+                OPEN_METEO_URL,
+                params=params,
+                timeout=httpx.Timeout(timeout, connect=min(CONNECT_TIMEOUT, timeout)),
+            ),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        UPSTREAM_DURATION.observe(time.perf_counter() - started, "timeout")
+        raise httpx.ReadTimeout(f"attempt deadline of {timeout:.2f}s exceeded")
+    except httpx.TransportError as e:
+        outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "transport_error"
+        UPSTREAM_DURATION.observe(time.perf_counter() - started, outcome)
+        raise
+    elapsed = time.perf_counter() - started
+    UPSTREAM_DURATION.observe(elapsed, _outcome(resp.status_code))
+    if _usable(resp):
+        hedger.observe(elapsed)
+    return resp
+
+async def _hedged(client: httpx.AsyncClient, params: dict, timeout: float) -> httpx.Response:
+    """
+    Попытка с хеджированием: если ответа нет дольше скользящего p95, уходит второй
+    такой же запрос, и берётся первый годный ответ. Хедж тратит бюджет hedger и
+    слот limiter, но в очередь limiter не встаёт: нет свободного слота — нет хеджа.
+    """
+    hedger.on_request()
+    primary = asyncio.ensure_future(_exchange(client, params, timeout))
+    delay = hedger.delay()
+    if not hedger.enabled or delay >= timeout:
+        return await primary
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        if not hedger.allow():
+            return await primary
+        if not await limiter.try_acquire():
+            hedger.record("no_capacity")
+            return await primary
+        hedger.record("fired")
+        try:
+            hedge = asyncio.ensure_future(_exchange(client, params, timeout - delay))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None and _usable(task.result()):
+                        if task is hedge:
+                            hedger.record("won")
+                        return task.result()
+            # обе попытки неудачны — дальше решает обычная логика ретраев по основной
+            return primary.result()
+        finally:
+            hedge.cancel()
+            await asyncio.gather(hedge, return_exceptions=True)
+            limiter.release()
+    finally:
+        primary.cancel()
+        await asyncio.gather(primary, return_exceptions=True)
+
+async def _get_json(params: dict):
+    """
+    GET к Open-Meteo через общий клиент: ретраи с backoff, хеджирование медленных
+    попыток и общий бюджет времени REQUEST_BUDGET на весь вызов.
+    """
+    client = get_client()
+    deadline = time.monotonic() + REQUEST_BUDGET
+    # один check на вызов: в half_open весь вызов — это одна проба, и её ретраи
+    # не должны упираться в собственный слот пробы
+    breaker.check()
+    probe = breaker.state == HALF_OPEN
+    try:
+        return await _attempts(client, params, deadline)
+    finally:
+        if probe:
+            breaker.release_probe()  # после record_success/record_failure цепь уже не half_open
+
+async def _attempts(client: httpx.AsyncClient, params: dict, deadline: float):
+    for attempt in range(ATTEMPTS):
+        if attempt:
+            if breaker.is_open:
+                # цепь открылась, пока мы ждали backoff, — дальше ретраить незачем
+                breaker.rejected += 1
+                raise CircuitOpenError(breaker.retry_after())
+            UPSTREAM_RETRIES.inc()
+        try:
+            async with limiter:
+                # остаток бюджета делится поровну между оставшимися попытками;
+                # время в очереди limiter тоже тратит бюджет
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise httpx.PoolTimeout(f"request budget of {REQUEST_BUDGET}s exhausted")
+                resp = await _hedged(client, params, remaining / (ATTEMPTS - attempt))
+        except httpx.PoolTimeout:
+            raise  # бюджет или пул исчерпаны у нас, апстрим тут ни при чём — breaker не трогаем
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            if attempt == ATTEMPTS - 1 or not isinstance(e, RETRYABLE_ERRORS):
+                raise
+            delay = min(0.2 * (2 ** attempt) + random.random() / 10, 2.0, max(deadline - time.monotonic(), 0.0))
+            await asyncio.sleep(delay)
+            continue
+        if resp.status_code == 429:
+            breaker.record_success()  # апстрим жив и отвечает, просто просит притормозить
+            # пауза до Retry-After ляжет на весь процесс через limiter
+            limiter.on_throttled(parse_retry_after(resp.headers.get("Retry-After")))
+            if attempt == ATTEMPTS - 1:
+                resp.raise_for_status()
+            continue
+        if resp.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        resp.raise_for_status()
+        limiter.on_success()
+        return resp.json()
+
+async def fetch_weather(
+    lat: float,
+    lon: float,
+    units: Literal["metric", "imperial"] = "metric",
+    hourly: Iterable[str] = (),
+    forecast_days: Optional[int] = None,
+) -> dict:
     """
     Возвращает сырые данные Open-Meteo (dict). С ретраями и таймаутом.
+    hourly — имена переменных Open-Meteo для почасового прогноза (блок "hourly" в ответе).
     """
     params = {
         "latitude": lat,
@@ -22,22 +256,31 @@ async def fetch_weather(lat: float, lon: float, units: Literal["metric", "imperi
         "timezone": "auto",
         **_units_to_params(units),
     }
+    if hourly:
+        params["hourly"] = ",".join(hourly)
+    if forecast_days is not None:
+        params["forecast_days"] = forecast_days
+    return await _get_json(params)
 
-    timeout = httpx.Timeout(5.0, connect=2.0)
-    headers = {"User-Agent": "async-weather-proxy/0.1"}
-
-    # Простейшие ретраи с экспоненциальным backoff + jitter
-    for attempt in range(3):
-        try:
-            async with httpx.AsyncClient(timeout=timeout, headers=headers) as client:
-                resp = await client.get(OPEN_METEO_URL, params=params)
-                resp.raise_for_status()
-                return resp.json()
-        except (httpx.ConnectError, httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
-            if attempt == 2:
-                raise
-            delay = min(0.2 * (2 ** attempt) + random.random() / 10, 2.0)
-            await asyncio.sleep(delay)
+async def fetch_weather_many(
+    points: Sequence[tuple[float, float]], units: Literal["metric", "imperial"] = "metric"
+) -> List[dict]:
+    """
+    Несколько точек одним запросом: Open-Meteo принимает списки latitude/longitude
+    через запятую и отвечает массивом в том же порядке (для одной точки — объектом).
+    """
+    params = {
+        "latitude": ",".join(str(lat) for lat, _ in points),
+        "longitude": ",".join(str(lon) for _, lon in points),
+        "current": "temperature_2m,wind_speed_10m",
+        "timezone": "auto",
+        **_units_to_params(units),
+    }
+    raw = await _get_json(params)
+    results = raw if isinstance(raw, list) else [raw]
+    if len(results) != len(points):
+        raise ValueError(f"upstream returned {len(results)} locations for {len(points)} requested")
+    return results
 
 def normalize_open_meteo(raw: dict) -> dict:
     cur = raw.get("current") or {}
@@ -49,3 +292,6 @@ def normalize_open_meteo(raw: dict) -> dict:
         "timezone": raw.get("timezone"),
     }
 
+def normalize_hourly(raw: dict) -> HourlySeries:
+    """Блок "hourly" -> колонки с нашими именами переменных и временем в UTC."""
+    return HourlySeries.from_open_meteo(raw.get("hourly") or {}, HOURLY_VARIABLES, raw.get("utc_offset_seconds") or 0)
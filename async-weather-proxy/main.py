@@ -1,72 +1,597 @@
-from fastapi import FastAPI, HTTPException, Query
-from typing import Literal
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from typing import Literal, Optional
 import asyncio
+import logging
+import math
+from datetime import datetime, timezone
+import os
+import time
+import orjson
 from fastapi import Body
-from schemas import BatchWeatherIn, Coords
+from schemas import BatchWeatherIn, Coords, PrefetchConfigIn
+from responses import FastJSONResponse, cache_control, etag_for, hit_response, not_modified
+import metrics
 
-from clients.weather import fetch_weather, normalize_open_meteo
-from cache.memory import make_key, get as cache_get, set as cache_set
-from cache import memory as cache
+from clients import weather as upstream
+from clients.weather import (
+    HOURLY_VARIABLES,
+    CircuitOpenError,
+    fetch_weather,
+    fetch_weather_many,
+    normalize_hourly,
+    normalize_open_meteo,
+)
+from cache.base import CacheBackend, CacheQuery, Entry
+from cache.keys import cell_key, cell_of
+from cache.memory import MemoryCache
+from cache.series import rounded
+from cache import snapshot
+from cache.singleflight import SingleFlight
+from cache.sqlite import SQLiteCache
+from cache.tiered import TieredCache
+from prefetch import PREFETCH_BBOX, PREFETCH_LOCATIONS, Prefetcher, parse_bboxes, parse_locations
 
+log = logging.getLogger(__name__)
 
-app = FastAPI(title="Async Weather Proxy")
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # memory | shared | tiered
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "weather-cache.sqlite3")
+L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "10000"))
+# Снимок кэша в памяти для тёплого старта; пустой путь — выключено
+SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "")
+SNAPSHOT_INTERVAL = float(os.getenv("CACHE_SNAPSHOT_INTERVAL", "300"))
+
+
+def create_cache(kind: str = CACHE_BACKEND) -> CacheBackend:
+    """memory — кэш процесса; shared — общий SQLite-файл для всех воркеров; tiered — L1 в памяти + shared L2."""
+    if kind == "memory":
+        return MemoryCache()
+    if kind == "shared":
+        return SQLiteCache(SHARED_CACHE_PATH)
+    if kind == "tiered":
+        return TieredCache(MemoryCache(max_entries=L1_MAX_ENTRIES), SQLiteCache(SHARED_CACHE_PATH))
+    raise ValueError(f"unknown CACHE_BACKEND: {kind}")
+
+
+cache = create_cache()
+
+
+def _snapshot_target() -> Optional[MemoryCache]:
+    """Снимок нужен только кэшу в памяти процесса (shared L2 и так на диске)."""
+    if SNAPSHOT_PATH and isinstance(cache, MemoryCache):
+        return cache
+    return None
+
+
+async def _snapshot_step(step: str, target: MemoryCache) -> None:
+    # битый файл или ошибка записи не должны останавливать цикл снимков
+    try:
+        await getattr(snapshot, step)(target, SNAPSHOT_PATH)
+    except Exception:
+        metrics.SNAPSHOT_ERRORS.inc(step)
+        log.exception("cache snapshot %s failed: %s", step, SNAPSHOT_PATH)
+
+
+async def _snapshot_forever(target: MemoryCache) -> None:
+    await _snapshot_step("load", target)
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        await _snapshot_step("save", target)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # один httpx.AsyncClient с пулом соединений на весь процесс
+    await upstream.startup()
+    sweeper = cache.start_sweeper()
+    forecast_sweeper = forecasts.start_sweeper()
+    target = _snapshot_target()
+    # снимок грузится в фоне: воркер принимает запросы сразу
+    snapshots = asyncio.create_task(_snapshot_forever(target)) if target is not None else None
+    prefetching = prefetcher.start()
+    try:
+        yield
+    finally:
+        try:
+            await prefetcher.stop(prefetching)
+            if snapshots is not None:
+                snapshots.cancel()
+                await asyncio.gather(snapshots, return_exceptions=True)
+                # ждёт прерванную периодическую запись (если она шла) и пишет поверх неё
+                await _snapshot_step("save", target)
+        finally:
+            await cache.stop_sweeper(sweeper)
+            await forecasts.stop_sweeper(forecast_sweeper)
+            await upstream.shutdown()
+            await cache.close()
+
+
+app = FastAPI(title="Async Weather Proxy", lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 @app.get("/health")
 async def health():
     return {"ok": True}
 
-CACHE_TTL = 300  # seconds
+@app.get("/health/upstream")
+async def health_upstream():
+    return {"breaker": upstream.breaker.stats(), "limiter": upstream.limiter.stats(), "hedging": upstream.hedger.stats()}
+
+CACHE_TTL = 300  # seconds, мягкий TTL: после него запись считается stale
+CACHE_STALE_TTL = 600  # seconds, сколько ещё можно отдавать stale, пока идёт обновление
+REFRESH_AHEAD = 30  # seconds до мягкого TTL, когда горячие ключи обновляются заранее
+HOT_KEY_HITS = 5  # попаданий с последнего обновления, чтобы ключ считался горячим
 
-async def fetch_or_cache(item: Coords) -> dict:
-    key = make_key(item.lat, item.lon, item.units)
-    cached = await cache_get(key)
-    if cached is not None:
-        return {"lat": item.lat, "lon": item.lon, "units": item.units, **cached, "cached": True}
+inflight = SingleFlight()
+refreshes = {"stale": 0, "ahead": 0, "prefetch": 0}
 
-    raw = await fetch_weather(item.lat, item.lon, item.units)
-    data = normalize_open_meteo(raw)
-    await cache_set(key, data, ttl_sec=CACHE_TTL)
-    return {"lat": item.lat, "lon": item.lon, "units": item.units, **data, "cached": False}
+Cell = tuple[float, float]
+
+async def _store(key: str, cell: Cell, raw: dict) -> dict:
+    data = {**normalize_open_meteo(raw), "cell": {"lat": cell[0], "lon": cell[1]}}
+    await cache.set(key, data, ttl_sec=CACHE_TTL, stale_ttl_sec=CACHE_STALE_TTL)
+    return data
+
+async def _load(key: str, cell: Cell, units: str) -> dict:
+    # в апстрим уходит центр ячейки: все точки ячейки делят один ответ
+    raw = await fetch_weather(cell[0], cell[1], units)
+    return await _store(key, cell, raw)
+
+async def _load_many(misses: list[tuple[str, Cell]], units: str) -> dict[str, dict]:
+    """Одна пачка промахов с одинаковыми units — один запрос к апстриму."""
+    raws = await fetch_weather_many([cell for _, cell in misses], units)
+    return {key: await _store(key, cell, raw) for (key, cell), raw in zip(misses, raws)}
+
+async def _pick(chunk: asyncio.Task, key: str) -> dict:
+    return (await asyncio.shield(chunk))[key]
+
+def _refresh_in_background(key: str, cell: Cell, units: str, reason: str, load=_load) -> None:
+    # при открытой цепи stale отдаётся как есть, без попыток обновления
+    if key in inflight or upstream.breaker.is_open:
+        return
+    refreshes[reason] += 1
+    inflight.start(key, lambda: load(key, cell, units))
+
+async def _cached(
+    key: str, cell: Cell, units: str, store: Optional[CacheBackend] = None, load=_load
+) -> Optional[tuple[Entry, bool]]:
+    """
+    (entry, stale) из кэша или None.
+    Stale-запись отдаётся сразу, а обновление уходит в фон; горячие ключи
+    обновляются в фоне ещё до истечения мягкого TTL.
+    """
+    entry = await (store or cache).get_entry(key)
+    if entry is None:
+        return None
+    now = time.monotonic()
+    if entry.is_stale(now):
+        _refresh_in_background(key, cell, units, "stale", load)
+        return entry, True
+    if entry.hits >= HOT_KEY_HITS and entry.fresh_until - now <= REFRESH_AHEAD:
+        _refresh_in_background(key, cell, units, "ahead", load)
+    return entry, False
+
+async def _load_or_raise(key: str, load) -> dict:
+    """Промах через single-flight; ошибки апстрима -> 503 (цепь открыта) или 502."""
+    try:
+        return await inflight.do(key, load)
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Upstream unavailable",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    except Exception:
+        raise HTTPException(status_code=502, detail="Upstream error")
+
+def _validators(key: str, data: dict, fresh: float, stale_window: float) -> dict:
+    """ETag и Cache-Control: клиенты и CDN держат ответ, пока не истечёт мягкий TTL записи."""
+    return {"ETag": etag_for(key, data.get("observed_at")), "Cache-Control": cache_control(fresh, stale_window)}
 
 @app.get("/weather")
 async def weather(
+    request: Request,
     lat: float = Query(..., ge=-90, le=90),
     lon: float = Query(..., ge=-180, le=180),
     units: Literal["metric", "imperial"] = "metric",
 ):
-    key = make_key(lat, lon, units)
-    cached = await cache_get(key)
-    if cached is not None:
-        return {"lat": lat, "lon": lon, "units": units, **cached, "cached": True}
+    cell = cell_of(lat, lon)
+    key = cell_key(cell, units)
+    prefetcher.seen(key, cell, units)
+    hit = await _cached(key, cell, units)
+    if hit is not None:
+        entry, stale = hit
+        headers = _validators(key, entry.data, *entry.ttls(time.monotonic()))
+        if not_modified(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        # горячий путь: данные записи сериализованы один раз, сюда подклеиваются только поля запроса
+        return hit_response({"lat": lat, "lon": lon, "units": units}, entry.encoded(), stale=stale, headers=headers)
+
+    data = await _load_or_raise(key, lambda: _load(key, cell, units))
+    return FastJSONResponse(
+        {"lat": lat, "lon": lon, "units": units, **data, "cached": False, "stale": False},
+        headers=_validators(key, data, CACHE_TTL, CACHE_STALE_TTL),
+    )
+
+# Почасовой прогноз: отдельный кэш в памяти, т.к. колонки array не сериализуются в JSON-бэкенды
+FORECAST_DAYS = int(os.getenv("FORECAST_DAYS", "7"))
+FORECAST_TTL = 1800  # seconds; Open-Meteo пересчитывает модели не чаще раза в час
+FORECAST_STALE_TTL = 1800
+forecasts = MemoryCache(
+    max_entries=int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "10000")),
+    max_bytes=int(os.getenv("FORECAST_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+
+async def _load_forecast(key: str, cell: Cell, units: str) -> dict:
+    raw = await fetch_weather(cell[0], cell[1], units, hourly=HOURLY_VARIABLES.values(), forecast_days=FORECAST_DAYS)
+    meta = normalize_open_meteo(raw)
+    data = {
+        "timezone": meta["timezone"],
+        "source": meta["source"],
+        "cell": {"lat": cell[0], "lon": cell[1]},
+        "series": normalize_hourly(raw),
+    }
+    await forecasts.set(key, data, ttl_sec=FORECAST_TTL, stale_ttl_sec=FORECAST_STALE_TTL)
+    return data
 
+def _parse_variables(variables: Optional[str]) -> Optional[list[str]]:
+    if variables is None:
+        return None
+    names = [v.strip() for v in variables.split(",") if v.strip()]
+    unknown = [v for v in names if v not in HOURLY_VARIABLES]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"unknown variables {unknown}; known: {list(HOURLY_VARIABLES)}")
+    return names
+
+def _epoch(value: Optional[datetime]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+@app.get("/forecast")
+async def forecast(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    units: Literal["metric", "imperial"] = "metric",
+    start: Optional[datetime] = Query(None, description="начало окна (ISO 8601 или unix time, без зоны — UTC); по умолчанию текущий час"),
+    end: Optional[datetime] = Query(None, description="конец окна (не включительно)"),
+    hours: int = Query(24, ge=1, le=16 * 24, description="максимальная длина окна в часах"),
+    variables: Optional[str] = Query(None, description="через запятую: " + ",".join(HOURLY_VARIABLES)),
+):
+    """
+    Почасовой прогноз в колоночном виде: time (unix-секунды UTC) и по массиву на переменную.
+    Серия ячейки кэшируется целиком, в ответ копируется только запрошенное окно.
+    """
+    names = _parse_variables(variables)
+    cell = cell_of(lat, lon)
+    key = cell_key(cell, units, kind="f")
+    hit = await _cached(key, cell, units, store=forecasts, load=_load_forecast)
+    if hit is not None:
+        entry, stale = hit
+        data, cached = entry.data, True
+    else:
+        data = await _load_or_raise(key, lambda: _load_forecast(key, cell, units))
+        cached = stale = False
+
+    begin = _epoch(start)
+    if begin is None:
+        begin = int(time.time()) // 3600 * 3600
+    stop = begin + hours * 3600
+    if end is not None:
+        stop = min(stop, _epoch(end))
+    times, columns = data["series"].slice(begin, stop, names)
+    return FastJSONResponse({
+        "lat": lat,
+        "lon": lon,
+        "units": units,
+        "timezone": data["timezone"],
+        "source": data["source"],
+        "cell": data["cell"],
+        "time": times.tolist(),
+        "hourly": {name: rounded(values) for name, values in columns.items()},
+        "cached": cached,
+        "stale": stale,
+    })
+
+BATCH_CHUNK_SIZE = 100  # точек в одном запросе к апстриму (ограничено длиной URL)
+
+async def _plan_many(
+    wanted: dict[str, tuple[Cell, str]],
+) -> tuple[dict[str, dict], dict[str, asyncio.Future], list[tuple[asyncio.Task, list[str]]], list[str]]:
+    """
+    Разложить ключи batch: (хиты из кэша, key -> задача загрузки, запущенные пачки,
+    ключи чужих загрузок). Хиты берутся из кэша, уже летящие ключи переиспользуются,
+    остальные промахи группируются по units и уходят пачками по BATCH_CHUNK_SIZE точек.
+    По каждому ключу из последнего списка вызывающий обязан сделать inflight.leave().
+    """
+    hits: dict[str, dict] = {}
+    pending: dict[str, asyncio.Future] = {}
+    misses: dict[str, list[tuple[str, Cell]]] = {}
+    joined: list[str] = []
+    for key, (cell, units) in wanted.items():
+        hit = await _cached(key, cell, units)
+        if hit is not None:
+            entry, stale = hit
+            hits[key] = {**entry.data, "cached": True, "stale": stale}
+            continue
+        task = inflight.join(key)
+        if task is not None:
+            pending[key] = task
+            joined.append(key)
+        else:
+            misses.setdefault(units, []).append((key, cell))
+
+    chunks = _start_chunks(misses, pending)
+    metrics.BATCH_UPSTREAM_CALLS.observe(len(chunks))
+    return hits, pending, chunks, joined
+
+def _start_chunks(
+    misses: dict[str, list[tuple[str, Cell]]], pending: dict[str, asyncio.Future]
+) -> list[tuple[asyncio.Task, list[str]]]:
+    """Запустить загрузку промахов пачками по BATCH_CHUNK_SIZE; задачи ключей пишутся в pending."""
+    chunks = []
+    for units, group in misses.items():
+        for i in range(0, len(group), BATCH_CHUNK_SIZE):
+            chunk = group[i:i + BATCH_CHUNK_SIZE]
+            # параллельность пачек ограничивает общий upstream.limiter
+            chunk_task = asyncio.ensure_future(_load_many(chunk, units))
+            for key, _ in chunk:
+                # регистрируем каждый ключ, чтобы параллельные /weather присоединялись к пачке
+                pending[key] = inflight.start(key, lambda t=chunk_task, k=key: _pick(t, k))
+            chunks.append((chunk_task, [key for key, _ in chunk]))
+    return chunks
+
+def _fragment(result) -> dict:
+    if isinstance(result, BaseException):
+        return {"error": str(result)}
+    return {**result, "cached": False, "stale": False}
+
+async def _resolve_many(wanted: dict[str, tuple[Cell, str]]) -> dict[str, dict]:
+    """key -> фрагмент ответа ({**data, cached, stale} или {error})."""
+    out, pending, _, joined = await _plan_many(wanted)
+    keys = list(pending)
     try:
-        raw = await fetch_weather(lat, lon, units)
-    except Exception:
-        raise HTTPException(status_code=502, detail="Upstream error")
+        results = await asyncio.gather(*(asyncio.shield(pending[k]) for k in keys), return_exceptions=True)
+    finally:
+        for key in joined:
+            inflight.leave(key)
+    for key, res in zip(keys, results):
+        out[key] = _fragment(res)
+    return out
+
+def _cancel_unshared(chunks: list[tuple[asyncio.Task, list[str]]]) -> None:
+    """Отменить свои пачки, если ни один их ключ не ждёт кто-то ещё (/weather или другой batch)."""
+    for chunk_task, keys in chunks:
+        if chunk_task.done() or any(inflight.waiters(k) for k in keys):
+            continue
+        for key in keys:
+            inflight.cancel(key)
+        chunk_task.cancel()
+
+def _encode_event(obj: dict, fmt: str) -> bytes:
+    line = orjson.dumps(obj)
+    return b"data: " + line + b"\n\n" if fmt == "sse" else line + b"\n"
+
+async def _stream_batch(keyed: list[tuple[Coords, str]], wanted: dict[str, tuple[Cell, str]], fmt: str):
+    """
+    Отдаёт результаты по мере готовности: сначала хиты, затем каждая пачка.
+    В каждой строке есть index — позиция элемента в запросе.
+    При отключении клиента незавершённые пачки отменяются.
+    """
+    positions: dict[str, list[tuple[int, Coords]]] = {}
+    for index, (item, key) in enumerate(keyed):
+        positions.setdefault(key, []).append((index, item))
 
-    data = normalize_open_meteo(raw)
-    await cache_set(key, data, ttl_sec=CACHE_TTL)
-    return {"lat": lat, "lon": lon, "units": units, **data, "cached": False}
+    def events(key: str, fragment: dict):
+        for index, item in positions[key]:
+            yield _encode_event(
+                {"index": index, "lat": item.lat, "lon": item.lon, "units": item.units, **fragment}, fmt
+            )
+
+    hits, pending, chunks, joined = await _plan_many(wanted)
+    try:
+        for key, fragment in hits.items():
+            for event in events(key, fragment):
+                yield event
+        # asyncio.wait не отменяет задачи, так что чужие ожидающие не пострадают
+        waiting = {task: key for key, task in pending.items()}
+        while waiting:
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                key = waiting.pop(task)
+                result = task.exception() if not task.cancelled() else asyncio.CancelledError()
+                for event in events(key, _fragment(result or task.result())):
+                    yield event
+    finally:
+        for key in joined:
+            inflight.leave(key)
+        _cancel_unshared(chunks)
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
 
 @app.post("/batch/weather")
-async def batch_weather(payload: BatchWeatherIn = Body(...)):
-    sem = asyncio.Semaphore(5)
+async def batch_weather(
+    request: Request,
+    payload: BatchWeatherIn = Body(...),
+    stream: Optional[Literal["ndjson", "sse"]] = Query(None),
+):
+    metrics.BATCH_ITEMS.observe(len(payload.items))
+    # дедупликация: одинаковые ячейки в batch запрашиваются один раз
+    keyed = []
+    wanted: dict[str, tuple[Cell, str]] = {}
+    for item in payload.items:
+        cell = cell_of(item.lat, item.lon)
+        key = cell_key(cell, item.units)
+        wanted[key] = (cell, item.units)
+        keyed.append((item, key))
+        prefetcher.seen(key, cell, item.units)
 
-    async def worker(item: Coords) -> dict:
-        async with sem:
-            try:
-                return await fetch_or_cache(item)
-            except Exception as e:
-                return {"lat": item.lat, "lon": item.lon, "units": item.units, "error": str(e)}
+    accept = request.headers.get("accept", "")
+    fmt = stream or next((f for f, mt in STREAM_MEDIA_TYPES.items() if mt in accept), None)
+    if fmt is not None:
+        return StreamingResponse(_stream_batch(keyed, wanted, fmt), media_type=STREAM_MEDIA_TYPES[fmt])
 
-    tasks = [worker(it) for it in payload.items]
-    results = await asyncio.gather(*tasks, return_exceptions=False)
-    return results
+    resolved = await _resolve_many(wanted)
+    return FastJSONResponse([
+        {"lat": item.lat, "lon": item.lon, "units": item.units, **resolved[key]}
+        for item, key in keyed
+    ])
+
+async def _prefetch_many(wanted: dict[str, tuple[Cell, str]]) -> int:
+    """Обновить ключи прогрева теми же пачками, что и batch; вернуть число успешных."""
+    pending: dict[str, asyncio.Future] = {}
+    misses: dict[str, list[tuple[str, Cell]]] = {}
+    for key, (cell, units) in wanted.items():
+        # ключ уже грузится (промах или фоновое обновление) — второй запрос не нужен
+        if key not in inflight:
+            misses.setdefault(units, []).append((key, cell))
+    _start_chunks(misses, pending)
+    refreshes["prefetch"] += len(pending)
+    results = await asyncio.gather(*(asyncio.shield(t) for t in pending.values()), return_exceptions=True)
+    return sum(not isinstance(res, BaseException) for res in results)
+
+prefetcher = Prefetcher(cache, _prefetch_many, upstream, chunk_size=BATCH_CHUNK_SIZE)
+prefetcher.configure(parse_locations(PREFETCH_LOCATIONS), parse_bboxes(PREFETCH_BBOX))
+
+@app.get("/prefetch")
+async def prefetch_status(keys: int = Query(0, ge=0, le=1000)):
+    """Состояние прогрева; keys=N — первые N ключей тёплого набора."""
+    wanted = prefetcher.warm_set()
+    out = {**prefetcher.stats(), "warm_keys": len(wanted)}
+    if keys:
+        out["keys"] = list(wanted)[:keys]
+    return out
+
+@app.patch("/prefetch")
+async def prefetch_configure(payload: PrefetchConfigIn = Body(...)):
+    """Поменять тёплый набор; переданные поля заменяются целиком, run=true — сразу прогнать цикл."""
+    try:
+        prefetcher.configure(
+            locations=None if payload.locations is None else [(c.lat, c.lon, c.units) for c in payload.locations],
+            bboxes=None if payload.bboxes is None else [
+                ((b.min_lat, b.min_lon, b.max_lat, b.max_lon), b.units) for b in payload.bboxes
+            ],
+            top_n=payload.top_n,
+            enabled=payload.enabled,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if payload.run:
+        await prefetcher.run_once()
+    return await prefetch_status(keys=0)
+
+CACHE_COUNTERS = ("hits", "stale_hits", "misses", "evictions", "expired")
+
+def _cache_metric_lines(stats: dict) -> list[str]:
+    tiers = [("l1", stats["l1"]), ("l2", stats["l2"])] if "l1" in stats else [(stats["backend"], stats)]
+    lines = []
+    for name in CACHE_COUNTERS:
+        samples = [({"tier": tier}, s[name]) for tier, s in tiers if name in s]
+        lines += metrics.format_metric(f"cache_{name}_total", "counter", f"Cache {name.replace('_', ' ')}.", samples)
+    for name in ("size", "bytes"):
+        samples = [({"tier": tier}, s[name]) for tier, s in tiers if name in s]
+        lines += metrics.format_metric(f"cache_{name}", "gauge", f"Cache {name}.", samples)
+    return lines
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    flight = inflight.stats()
+    limiter = upstream.limiter.stats()
+    breaker = upstream.breaker.stats()
+    extra = _cache_metric_lines(await cache.stats())
+    extra += metrics.format_metric("singleflight_inflight", "gauge", "Keys being loaded right now.", [({}, flight["inflight"])])
+    extra += metrics.format_metric("singleflight_coalesced_total", "counter", "Requests that joined an in-flight load.", [({}, flight["coalesced"])])
+    extra += metrics.format_metric("background_refreshes_total", "counter", "Background refreshes by reason.", [({"reason": r}, n) for r, n in refreshes.items()])
+    extra += metrics.format_metric("upstream_in_flight", "gauge", "Upstream requests in flight.", [({}, limiter["in_flight"])])
+    extra += metrics.format_metric("upstream_queue_waiting", "gauge", "Callers waiting for the limiter.", [({}, limiter["waiting"])])
+    extra += metrics.format_metric("upstream_rate_limit", "gauge", "Current upstream request budget per second.", [({}, limiter["rate"])])
+    extra += metrics.format_metric("upstream_throttled_total", "counter", "Upstream 429 responses.", [({}, limiter["throttled"])])
+    extra += metrics.format_metric(
+        "breaker_state", "gauge", "Circuit breaker state (1 = current).",
+        [({"state": st}, int(breaker["state"] == st)) for st in ("closed", "open", "half_open")],
+    )
+    extra += metrics.format_metric("breaker_rejected_total", "counter", "Requests rejected by the open circuit.", [({}, breaker["rejected"])])
+    return PlainTextResponse(metrics.render(extra), media_type=metrics.CONTENT_TYPE)
+
+LIST_PAGE_SIZE = 100
+LIST_MAX_PAGE_SIZE = 1000
+
+def _parse_bbox(bbox: Optional[str]) -> Optional[tuple[float, float, float, float]]:
+    if bbox is None:
+        return None
+    try:
+        min_lat, min_lon, max_lat, max_lon = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="bbox must be min_lat,min_lon,max_lat,max_lon")
+    return min_lat, min_lon, max_lat, max_lon
+
+def _listing_item(key: str, entry: Entry, now: float) -> dict:
+    data = entry.decoded()
+    # etag совпадает с заголовком ETag у /weather и /cache/weather/{key}
+    return {
+        "key": key,
+        "expires_in": int(entry.ttls(now)[0]),
+        "stale": entry.is_stale(now),
+        **data,
+        "etag": etag_for(key, data.get("observed_at")),
+    }
+
+async def _stream_listing(query: CacheQuery):
+    async for batch in cache.iter_entries(query):
+        now = time.monotonic()
+        yield b"".join(_encode_event(_listing_item(key, entry, now), "ndjson") for key, entry in batch)
 
 @app.get("/cache/weather")
-async def list_cached_weather():
-    return await cache.items()
+async def list_cached_weather(
+    request: Request,
+    limit: int = Query(LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor предыдущей страницы"),
+    units: Optional[Literal["metric", "imperial"]] = None,
+    prefix: str = "",
+    bbox: Optional[str] = Query(None, description="min_lat,min_lon,max_lat,max_lon"),
+    min_ttl: Optional[float] = Query(None, ge=0, description="не меньше секунд до мягкого TTL"),
+    max_ttl: Optional[float] = Query(None, ge=0, description="не больше секунд до мягкого TTL"),
+    stream: Optional[Literal["ndjson"]] = Query(None),
+):
+    """
+    Страница записей в порядке ключа. Следующая страница — по курсору из
+    X-Next-Cursor (или Link rel="next"). stream=ndjson (или Accept: application/x-ndjson)
+    отдаёт все подходящие записи построчно порциями, без курсора и limit.
+    """
+    query = CacheQuery(units=units, prefix=prefix, bbox=_parse_bbox(bbox), min_ttl=min_ttl, max_ttl=max_ttl)
+    if stream or STREAM_MEDIA_TYPES["ndjson"] in request.headers.get("accept", ""):
+        return StreamingResponse(_stream_listing(query), media_type=STREAM_MEDIA_TYPES["ndjson"])
+
+    page = await cache.scan(query, after=cursor, limit=limit)
+    now = time.monotonic()
+    headers = {}
+    if len(page) == limit:
+        next_cursor = page[-1][0]
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return FastJSONResponse([_listing_item(key, entry, now) for key, entry in page], headers=headers)
+
+@app.get("/cache/weather/stats")
+async def cached_weather_stats():
+    # только счётчики бэкенда и single-flight: записи не перебираются
+    return {**await cache.stats(), **inflight.stats(), "refreshes": refreshes, "forecasts": await forecasts.stats()}
+
+@app.get("/cache/weather/{key}")
+async def cached_weather_entry(key: str, request: Request):
+    """Одна запись кэша с ETag/Cache-Control; If-None-Match с тем же тегом даёт 304."""
+    # просмотр записи — не попадание: не двигает LRU и не приближает refresh-ahead
+    entry = await cache.peek(key)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Not cached")
+    now = time.monotonic()
+    headers = _validators(key, entry.decoded(), *entry.ttls(now))
+    if not_modified(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(_listing_item(key, entry, now), headers=headers)
 
 @app.delete("/cache/weather", status_code=204)
 async def clear_cached_weather():
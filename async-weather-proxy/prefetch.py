@@ -0,0 +1,251 @@
+"""
+Фоновый прогрев кэша: известные точки обновляются до истечения мягкого TTL,
+чтобы первый запрос в окне TTL не платил за поход в апстрим.
+
+Тёплый набор собирается из трёх источников:
+    - список точек (PREFETCH_LOCATIONS="52.52,13.41;48.85,2.35:imperial");
+    - сетка по bbox (PREFETCH_BBOX="min_lat,min_lon,max_lat,max_lon[:units];...", шаг — ячейка кэша);
+    - top-N ключей недавнего трафика (PREFETCH_TOP_N).
+Обновление идёт тем же путём, что и /batch/weather (single-flight + пачки), а
+на цикл берётся только доля бюджета limiter — пользовательские запросы важнее.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from cache.base import CacheBackend
+from cache.keys import GRID_KM, KM_PER_DEGREE, cell_key, cell_of
+
+Cell = Tuple[float, float]
+Wanted = Dict[str, Tuple[Cell, str]]
+
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "30"))  # секунд между циклами; 0 — выключено
+PREFETCH_AHEAD = float(os.getenv("PREFETCH_AHEAD", "60"))  # обновлять, если до мягкого TTL осталось меньше
+PREFETCH_SHARE = float(os.getenv("PREFETCH_SHARE", "0.2"))  # доля UPSTREAM_RPS, которую может занять прогрев
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "0"))
+PREFETCH_MAX_KEYS = int(os.getenv("PREFETCH_MAX_KEYS", "10000"))  # потолок точек из списка и ячеек сеток
+PREFETCH_LOCATIONS = os.getenv("PREFETCH_LOCATIONS", "")
+PREFETCH_BBOX = os.getenv("PREFETCH_BBOX", "")
+
+
+def parse_locations(spec: str) -> List[Tuple[float, float, str]]:
+    """"lat,lon[:units];..." -> [(lat, lon, units)]"""
+    points = []
+    for part in filter(None, (p.strip() for p in spec.split(";"))):
+        coords, _, units = part.partition(":")
+        lat, lon = (float(v) for v in coords.split(","))
+        points.append((lat, lon, units or "metric"))
+    return points
+
+
+def parse_bboxes(spec: str) -> List[Tuple[Tuple[float, float, float, float], str]]:
+    """"min_lat,min_lon,max_lat,max_lon[:units];..." -> [(bbox, units)]"""
+    boxes = []
+    for part in filter(None, (p.strip() for p in spec.split(";"))):
+        coords, _, units = part.partition(":")
+        bbox = tuple(float(v) for v in coords.split(","))
+        if len(bbox) != 4:
+            raise ValueError(f"bbox needs 4 numbers: {part!r}")
+        check_bbox(bbox)
+        boxes.append((bbox, units or "metric"))
+    return boxes
+
+
+def check_bbox(bbox: Tuple[float, float, float, float]) -> None:
+    min_lat, min_lon, max_lat, max_lon = bbox
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError(f"bbox {bbox} has min greater than max")
+
+
+def grid_cells(bbox: Tuple[float, float, float, float], km: float = GRID_KM) -> Iterable[Cell]:
+    """Центры ячеек кэша, покрывающих bbox (по одной точке на ячейку)."""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    km = km if km > 0 else 1.0
+    lat_step = km / KM_PER_DEGREE
+    seen = set()
+    for i in range(int((max_lat - min_lat) / lat_step) + 1):
+        lat = min(min_lat + i * lat_step, max_lat)
+        lon_step = km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        for j in range(int((max_lon - min_lon) / lon_step) + 1):
+            cell = cell_of(lat, min(min_lon + j * lon_step, max_lon))
+            if cell not in seen:
+                seen.add(cell)
+                yield cell
+
+
+def grid_size(bbox: Tuple[float, float, float, float], km: float = GRID_KM) -> int:
+    """Оценка числа ячеек без перебора — чтобы отклонить слишком большой bbox заранее."""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    if min_lat > max_lat or min_lon > max_lon:
+        # перевёрнутый bbox пуст; отрицательная оценка скрыла бы в сумме соседний огромный
+        return 0
+    km = km if km > 0 else 1.0
+    mid = math.radians((min_lat + max_lat) / 2)
+    rows = (max_lat - min_lat) * KM_PER_DEGREE / km + 1
+    cols = (max_lon - min_lon) * KM_PER_DEGREE * max(math.cos(mid), 1e-6) / km + 1
+    return int(rows * cols)
+
+
+class Prefetcher:
+    """
+    Цикл прогрева. Решает, какие ключи обновить, а само обновление отдаёт
+    refresh(wanted) из main — тот же путь пачек, что у /batch/weather.
+    """
+
+    def __init__(
+        self,
+        cache: CacheBackend,
+        refresh: Callable[[Wanted], Awaitable[int]],
+        upstream,
+        chunk_size: int = 100,
+        interval: float = PREFETCH_INTERVAL,
+        ahead: float = PREFETCH_AHEAD,
+        share: float = PREFETCH_SHARE,
+        top_n: int = PREFETCH_TOP_N,
+    ):
+        self.cache = cache
+        self.refresh = refresh
+        self.upstream = upstream  # модуль clients.weather: limiter и breaker берутся актуальные
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.ahead = ahead
+        self.share = share
+        self.top_n = top_n
+        self.enabled = True
+        self.locations: List[Tuple[float, float, str]] = []
+        self.bboxes: List[Tuple[Tuple[float, float, float, float], str]] = []
+        self._static: Wanted = {}
+        self._traffic: Counter = Counter()
+        self._traffic_cells: Wanted = {}
+        self.counters = {"cycles": 0, "refreshed": 0, "failed": 0, "deferred": 0, "skipped_cycles": 0, "errors": 0}
+        self.last_run: Optional[float] = None
+
+    def configure(
+        self,
+        locations: Optional[List[Tuple[float, float, str]]] = None,
+        bboxes: Optional[List[Tuple[Tuple[float, float, float, float], str]]] = None,
+        top_n: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ) -> None:
+        """
+        Заменить переданные части конфигурации; None — оставить как есть.
+        Всё проверяется до первого присваивания: ValueError не оставляет конфигурацию наполовину изменённой.
+        """
+        locations = self.locations if locations is None else list(locations)
+        bboxes = self.bboxes if bboxes is None else list(bboxes)
+        for bbox, _ in bboxes:
+            check_bbox(bbox)
+        if len(locations) + sum(grid_size(bbox) for bbox, _ in bboxes) > PREFETCH_MAX_KEYS:
+            raise ValueError(f"warm set is larger than PREFETCH_MAX_KEYS={PREFETCH_MAX_KEYS} points")
+        self.locations = locations
+        self.bboxes = bboxes
+        if top_n is not None:
+            self.top_n = top_n
+        if enabled is not None:
+            self.enabled = enabled
+        static: Wanted = {}
+        for lat, lon, units in self.locations:
+            cell = cell_of(lat, lon)
+            static[cell_key(cell, units)] = (cell, units)
+        for bbox, units in self.bboxes:
+            for cell in grid_cells(bbox):
+                static[cell_key(cell, units)] = (cell, units)
+        self._static = static
+
+    def seen(self, key: str, cell: Cell, units: str) -> None:
+        """Учёт трафика для top-N; вызывается на каждый запрос, поэтому только инкремент."""
+        if self.top_n:
+            self._traffic[key] += 1
+            self._traffic_cells[key] = (cell, units)
+
+    def warm_set(self) -> Wanted:
+        wanted = dict(self._static)
+        for key, _ in self._traffic.most_common(self.top_n):
+            wanted.setdefault(key, self._traffic_cells[key])
+        return wanted
+
+    def _decay_traffic(self) -> None:
+        # «недавний» трафик: счётчики делятся пополам каждый цикл, хвост выбрасывается
+        keep = self._traffic.most_common(self.top_n * 10)
+        self._traffic = Counter({key: n // 2 for key, n in keep if n > 1})
+        self._traffic_cells = {key: self._traffic_cells[key] for key in self._traffic}
+
+    def budget(self) -> int:
+        """Запросов к апстриму на цикл: share от текущей (возможно сниженной после 429) скорости limiter."""
+        return max(int(self.upstream.limiter.rate * self.share * self.interval), 1)
+
+    async def due(self, wanted: Wanted) -> List[Tuple[float, str]]:
+        """(оставшийся мягкий TTL, key) для ключей, которые пора обновить; сначала самые срочные."""
+        now = time.monotonic()
+        due = []
+        for key in wanted:
+            entry = await self.cache.peek(key)
+            remaining = -1.0 if entry is None else entry.fresh_until - now
+            if remaining <= self.ahead:
+                due.append((remaining, key))
+        due.sort()
+        return due
+
+    async def run_once(self) -> int:
+        """Один цикл прогрева; вернуть число обновлённых ключей."""
+        self.counters["cycles"] += 1
+        self.last_run = time.time()
+        wanted = self.warm_set()
+        if self.top_n:
+            self._decay_traffic()
+        # при открытой цепи или очереди в limiter прогрев только мешает
+        if not self.enabled or not wanted or self.upstream.breaker.is_open or self.upstream.limiter.waiting:
+            self.counters["skipped_cycles"] += 1
+            return 0
+        due = await self.due(wanted)
+        allowed = self.budget() * self.chunk_size
+        batch = {key: wanted[key] for _, key in due[:allowed]}
+        self.counters["deferred"] += max(len(due) - allowed, 0)
+        if not batch:
+            return 0
+        refreshed = await self.refresh(batch)
+        self.counters["refreshed"] += refreshed
+        self.counters["failed"] += len(batch) - refreshed
+        return refreshed
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                # цикл прогрева не должен умирать из-за одного неудачного прохода
+                self.counters["errors"] += 1
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Запустить цикл (из lifespan приложения); interval <= 0 — прогрев выключен."""
+        if self.interval <= 0:
+            return None
+        return asyncio.create_task(self._run_forever())
+
+    async def stop(self, task: Optional[asyncio.Task]) -> None:
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "interval": self.interval,
+            "ahead": self.ahead,
+            "budget_per_cycle": self.budget(),
+            "locations": [{"lat": lat, "lon": lon, "units": units} for lat, lon, units in self.locations],
+            "bboxes": [
+                {"min_lat": b[0], "min_lon": b[1], "max_lat": b[2], "max_lon": b[3], "units": units}
+                for b, units in self.bboxes
+            ],
+            "top_n": self.top_n,
+            "static_keys": len(self._static),
+            "tracked_keys": len(self._traffic),
+            "last_run": self.last_run,
+            **self.counters,
+        }
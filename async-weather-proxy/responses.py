@@ -0,0 +1,68 @@
+"""
+Быстрая JSON-сериализация ответов через orjson.
+
+Хиты кэша не собираются в dict заново: у записи кэша есть готовые байты
+данных, и в них подклеиваются только поля конкретного запроса.
+
+Для условных запросов здесь же ETag/If-None-Match и Cache-Control.
+"""
+import hashlib
+from typing import Any, Optional
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+_TAILS = {
+    (cached, stale): orjson.dumps({"cached": cached, "stale": stale})[1:]
+    for cached in (True, False)
+    for stale in (True, False)
+}
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse на orjson. Если вернуть его из обработчика напрямую, FastAPI пропускает jsonable_encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def splice(head: dict, body: bytes, cached: bool, stale: bool) -> bytes:
+    """
+    {**head, **data, "cached": ..., "stale": ...} из готовых байтов data
+    без повторной сериализации data.
+    """
+    out = orjson.dumps(head)[:-1]
+    inner = body[1:-1]
+    if inner:
+        out += b"," + inner
+    return out + b"," + _TAILS[(cached, stale)]
+
+
+def hit_response(head: dict, body: bytes, cached: bool = True, stale: bool = False, headers: Optional[dict] = None) -> Response:
+    return Response(splice(head, body, cached, stale), media_type="application/json", headers=headers)
+
+
+def etag_for(key: str, observed_at: Optional[str]) -> str:
+    """
+    Слабый ETag записи: ключ кэша + время наблюдения апстрима. Тело хита и промаха
+    различается только флагами cached/stale, поэтому W/.
+    """
+    digest = hashlib.blake2b(f"{key}|{observed_at}".encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def cache_control(fresh: float, stale_window: float) -> str:
+    value = f"max-age={int(fresh)}"
+    if stale_window > 0:
+        value += f", stale-while-revalidate={int(stale_window)}"
+    return value
+
+
+def not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    """Слабое сравнение If-None-Match (RFC 9110): список тегов или *."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
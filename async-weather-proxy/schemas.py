@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import List, Literal
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional
 
 class Coords(BaseModel):
     lat: float = Field(..., ge=-90, le=900)
@@ -8,3 +8,23 @@ class Coords(BaseModel):
 
 class BatchWeatherIn(BaseModel):
     items: List[Coords]
+
+class BBox(BaseModel):
+    min_lat: float = Field(..., ge=-90, le=90)
+    min_lon: float = Field(..., ge=-180, le=180)
+    max_lat: float = Field(..., ge=-90, le=90)
+    max_lon: float = Field(..., ge=-180, le=180)
+    units: Literal["metric", "imperial"] = "metric"
+
+    @model_validator(mode="after")
+    def _ordered(self):
+        if self.min_lat > self.max_lat or self.min_lon > self.max_lon:
+            raise ValueError("min_lat/min_lon must not exceed max_lat/max_lon")
+        return self
+
+class PrefetchConfigIn(BaseModel):
+    locations: Optional[List[Coords]] = None
+    bboxes: Optional[List[BBox]] = None
+    top_n: Optional[int] = Field(None, ge=0, le=10000)
+    enabled: Optional[bool] = None
+    run: bool = False
@@ -0,0 +1,182 @@
+import asyncio
+import time
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from cache.base import CacheQuery
+from cache.memory import MemoryCache
+from cache.sqlite import SQLiteCache
+from cache.tiered import TieredCache
+
+
+def test_shared_cache_is_visible_to_other_workers(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    worker_a, worker_b = SQLiteCache(path), SQLiteCache(path)
+
+    async def scenario():
+        await worker_a.set("w:1:2:metric", {"temperature": 7.5}, ttl_sec=60, stale_ttl_sec=60)
+        return await worker_b.get_entry("w:1:2:metric"), await worker_b.get("w:missing")
+
+    entry, missing = asyncio.run(scenario())
+    assert entry.data == {"temperature": 7.5}
+    assert not entry.is_stale(entry.fresh_until - 1)
+    assert missing is None
+
+
+def test_shared_cache_sweep_drops_expired(tmp_path):
+    shared = SQLiteCache(str(tmp_path / "shared.sqlite3"))
+
+    async def scenario():
+        await shared.set("w:old", {"temperature": 1}, ttl_sec=-10)
+        await shared.set("w:new", {"temperature": 2}, ttl_sec=60)
+        removed = await shared.sweep()
+        return removed, [k for k, _ in await shared.scan()]
+
+    removed, keys = asyncio.run(scenario())
+    assert removed == 1
+    assert keys == ["w:new"]
+
+
+def test_shared_cache_size_counter_and_batched_sweep(tmp_path, monkeypatch):
+    from cache import sqlite
+
+    monkeypatch.setattr(sqlite, "SWEEP_BATCH", 3)
+    path = str(tmp_path / "shared.sqlite3")
+    worker_a, worker_b = SQLiteCache(path, max_entries=5), SQLiteCache(path, max_entries=5)
+
+    async def scenario():
+        for i in range(8):
+            await worker_a.set(f"w:old:{i}", {"temperature": i}, ttl_sec=-10)
+        for i in range(9):
+            await worker_b.set(f"w:new:{i}", {"temperature": i}, ttl_sec=60 + i)
+        await worker_a.set("w:new:8", {"temperature": 8}, ttl_sec=70)  # перезапись не меняет размер
+        before = (await worker_b.stats())["size"]
+        removed = await worker_a.sweep()
+        return before, removed, (await worker_b.stats())["size"], [k for k, _ in await worker_a.scan()]
+
+    before, removed, after, keys = asyncio.run(scenario())
+    assert before == 17
+    assert removed == 8
+    assert after == 5
+    assert keys == [f"w:new:{i}" for i in range(4, 9)]  # первыми ушли ближайшие к истечению
+    assert asyncio.run(SQLiteCache(path).stats())["size"] == 5  # счётчик в файле, а не в процессе
+
+
+def test_tiered_reads_through_to_shared_l2(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    writer = TieredCache(MemoryCache(), SQLiteCache(path))
+    reader = TieredCache(MemoryCache(), SQLiteCache(path))
+
+    async def scenario():
+        await writer.set("w:k", {"temperature": 3}, ttl_sec=60)
+        first = await reader.get("w:k")       # промах L1 -> L2, L1 заполняется
+        in_l1 = await reader.l1.get("w:k")
+        return first, in_l1
+
+    first, in_l1 = asyncio.run(scenario())
+    assert first == {"temperature": 3}
+    assert in_l1 == {"temperature": 3}
+
+
+def test_snapshot_roundtrip_keeps_remaining_ttl(tmp_path):
+    from cache import snapshot
+
+    path = str(tmp_path / "cache.snapshot")
+    source, target = MemoryCache(), MemoryCache()
+
+    async def scenario():
+        await source.set("w:a", {"temperature": 1.5}, ttl_sec=100, stale_ttl_sec=50)
+        await source.set("w:gone", {"temperature": 0}, ttl_sec=-1)
+        saved = await snapshot.save(source, path)
+        loaded = await snapshot.load(target, path)
+        return saved, loaded, await target.get_entry("w:a")
+
+    saved, loaded, entry = asyncio.run(scenario())
+    assert saved == loaded == 1
+    assert entry.data == {"temperature": 1.5}
+    fresh, stale = entry.ttls(time.monotonic())
+    assert 98 < fresh <= 100
+    assert 49 < stale <= 50.5
+
+
+def test_cancelled_snapshot_save_does_not_race_the_next_one(tmp_path, monkeypatch):
+    from cache import snapshot
+
+    path = str(tmp_path / "cache.snapshot")
+    source, target = MemoryCache(), MemoryCache()
+    write_file = snapshot._write_file
+
+    def slow_write_file(*args):
+        time.sleep(0.1)
+        return write_file(*args)
+
+    monkeypatch.setattr(snapshot, "_write_file", slow_write_file)
+
+    async def scenario():
+        await source.set("w:a", {"temperature": 1}, ttl_sec=100)
+        periodic = asyncio.create_task(snapshot.save(source, path))
+        await asyncio.sleep(0.02)
+        periodic.cancel()  # поток записи продолжает работать
+        await asyncio.gather(periodic, return_exceptions=True)
+        await source.set("w:a", {"temperature": 2}, ttl_sec=100)
+        await snapshot.save(source, path)  # финальный снимок пишется после прерванного
+        await snapshot.load(target, path)
+        return await target.get("w:a")
+
+    assert asyncio.run(scenario()) == {"temperature": 2}
+    assert os.listdir(tmp_path) == ["cache.snapshot"]
+
+
+def test_snapshot_load_does_not_override_live_entries(tmp_path):
+    from cache import snapshot
+
+    path = str(tmp_path / "cache.snapshot")
+    source, target = MemoryCache(), MemoryCache()
+
+    async def scenario():
+        await source.set("w:a", {"temperature": 1}, ttl_sec=100)
+        await snapshot.save(source, path)
+        await target.set("w:a", {"temperature": 2}, ttl_sec=100)
+        await snapshot.load(target, path)
+        return await target.get("w:a")
+
+    assert asyncio.run(scenario()) == {"temperature": 2}
+
+
+def _fill(cache_backend, n=25):
+    async def scenario():
+        for i in range(n):
+            units = "metric" if i % 2 else "imperial"
+            await cache_backend.set(f"w:{50 + i}.0:{10 + i}.0:{units}", {"temperature": i}, ttl_sec=10 * i, stale_ttl_sec=60)
+    return scenario()
+
+
+def _pages(cache_backend, query=None, limit=4):
+    async def scenario():
+        keys, cursor = [], None
+        while True:
+            page = await cache_backend.scan(query, after=cursor, limit=limit)
+            keys += [k for k, _ in page]
+            if len(page) < limit:
+                return keys
+            cursor = page[-1][0]
+    return scenario()
+
+
+def test_scan_pages_in_key_order_with_filters(tmp_path):
+    for backend in (MemoryCache(), SQLiteCache(str(tmp_path / "scan.sqlite3"))):
+        asyncio.run(_fill(backend))
+        keys = asyncio.run(_pages(backend))
+        assert keys == sorted(keys) and len(keys) == 25
+
+        metric = asyncio.run(_pages(backend, CacheQuery(units="metric")))
+        assert len(metric) == 12 and all(k.endswith(":metric") for k in metric)
+
+        boxed = asyncio.run(_pages(backend, CacheQuery(bbox=(55, 0, 59.5, 20))))
+        assert boxed == ["w:55.0:15.0:metric", "w:56.0:16.0:imperial", "w:57.0:17.0:metric", "w:58.0:18.0:imperial", "w:59.0:19.0:metric"]
+
+        assert asyncio.run(_pages(backend, CacheQuery(prefix="w:6"))) == [f"w:6{i}.0:2{i}.0:{'metric' if i % 2 else 'imperial'}" for i in range(10)]
+
+        # у stale записей (ttl_sec=0 -> i == 0) оставшийся TTL 0
+        short = asyncio.run(_pages(backend, CacheQuery(max_ttl=25)))
+        assert sorted(short) == sorted(["w:50.0:10.0:imperial", "w:51.0:11.0:metric", "w:52.0:12.0:imperial"])
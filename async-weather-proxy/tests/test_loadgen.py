@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import main
+from bench.loadgen import drive, key_sampler, percentile
+from bench.stub_upstream import StubUpstream
+from clients import weather as upstream
+
+
+def test_zipf_keys_are_skewed_and_uniform_are_not():
+    def top_share(dist):
+        sample = key_sampler(dist, keys=100, seed=1)
+        draws = [sample() for _ in range(5000)]
+        return max(draws.count(p) for p in set(draws)) / len(draws)
+
+    assert top_share("zipf") > 0.1
+    assert top_share("uniform") < 0.05
+
+
+def test_percentile_nearest_rank():
+    ordered = [float(i) for i in range(1, 101)]
+    assert (percentile(ordered, 50), percentile(ordered, 99), percentile(ordered, 100)) == (50.0, 99.0, 100.0)
+
+
+def test_drive_reports_hits_and_upstream_calls(monkeypatch):
+    async def scenario():
+        stub = await StubUpstream().start()
+        monkeypatch.setattr(upstream, "OPEN_METEO_URL", stub.url)
+        monkeypatch.setattr(upstream, "breaker", upstream.CircuitBreaker())
+        await main.cache.clear()
+        await upstream.startup()
+        transport = httpx.ASGITransport(app=main.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+                report = await drive(client, key_sampler("zipf", keys=5), rps=400, duration=0.25)
+        finally:
+            await upstream.shutdown()
+            await stub.stop()
+        return report, stub.stats()
+
+    report, stats = asyncio.run(scenario())
+    assert report["statuses"] == {"200": 100}
+    assert report["latency_ms"]["p50"] <= report["latency_ms"]["p99"]
+    assert 1 <= stats["requests"] <= 5  # не больше одного запроса на ключ
+    assert report["hit_ratio"] >= 0.5
@@ -0,0 +1,242 @@
+import asyncio
+
+import httpx
+import pytest
+import respx
+from httpx import Response
+
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from clients import weather as upstream
+from clients.hedging import Hedger
+from clients.limiter import UpstreamLimiter, parse_retry_after
+from bench.stub_upstream import StubUpstream
+
+OPEN_METEO_SAMPLE = {
+    "timezone": "GMT",
+    "current": {"time": "2025-01-01T12:00", "temperature_2m": 1.5, "wind_speed_10m": 2.5},
+}
+
+
+@pytest.fixture
+def fresh_upstream(monkeypatch):
+    monkeypatch.setattr(upstream, "limiter", UpstreamLimiter(max_in_flight=4, rate=1000, burst=100))
+    monkeypatch.setattr(upstream, "breaker", upstream.CircuitBreaker())
+    monkeypatch.setattr(upstream, "hedger", Hedger())
+    monkeypatch.setattr(upstream, "_client", None)
+    monkeypatch.setattr(upstream, "_closed", False)
+    yield upstream
+    asyncio.run(upstream.shutdown())
+
+
+def test_client_is_not_recreated_after_shutdown(fresh_upstream):
+    async def scenario():
+        await fresh_upstream.startup()
+        await fresh_upstream.shutdown()
+        with pytest.raises(RuntimeError):
+            fresh_upstream.get_client()  # иначе новый клиент переживёт lifespan и не будет закрыт
+        client = await fresh_upstream.startup()
+        return client, fresh_upstream.get_client()
+
+    client, again = asyncio.run(scenario())
+    assert again is client and not client.is_closed
+
+
+def test_limiter_caps_in_flight():
+    limiter = UpstreamLimiter(max_in_flight=2, rate=1000, burst=100)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+    assert limiter.stats()["acquired"] == 6
+    assert limiter.stats()["queue_wait_max"] > 0
+
+
+def test_limiter_token_bucket_paces_requests():
+    limiter = UpstreamLimiter(max_in_flight=10, rate=100, burst=1)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(5):
+            async with limiter:
+                pass
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) >= 0.035  # 4 запроса сверх burst по 10 мс
+
+
+def test_retry_after_parsing():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None, default=1.5) == 1.5
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # дата в прошлом
+
+
+def test_429_backs_off_and_retries(fresh_upstream):
+    with respx.mock:
+        route = respx.get(upstream.OPEN_METEO_URL).mock(side_effect=[
+            Response(429, headers={"Retry-After": "0"}),
+            Response(200, json=OPEN_METEO_SAMPLE),
+        ])
+        raw = asyncio.run(upstream.fetch_weather(1.0, 2.0))
+    assert raw == OPEN_METEO_SAMPLE
+    assert route.call_count == 2
+    assert upstream.limiter.throttled == 1
+    assert upstream.limiter.rate < upstream.limiter.max_rate
+
+
+def test_breaker_opens_and_fails_fast(fresh_upstream, monkeypatch):
+    from clients.breaker import CircuitBreaker, CircuitOpenError
+
+    monkeypatch.setattr(upstream, "breaker", CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    with respx.mock:
+        route = respx.get(upstream.OPEN_METEO_URL).mock(return_value=Response(503))
+        with pytest.raises(Exception):
+            asyncio.run(upstream.fetch_weather(1.0, 2.0))
+        with pytest.raises(Exception):
+            asyncio.run(upstream.fetch_weather(1.0, 2.0))
+        assert upstream.breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(upstream.fetch_weather(1.0, 2.0))
+    assert route.call_count == 2
+    assert upstream.breaker.stats()["transitions"][-1]["to"] == "open"
+
+
+def test_breaker_half_open_probe_closes_circuit():
+    from clients.breaker import CircuitBreaker, CircuitOpenError
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == "open"
+    breaker.check()  # reset_timeout истёк — пропускаем пробу
+    assert breaker.state == "half_open"
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert [t["to"] for t in breaker.transitions] == ["open", "half_open", "closed"]
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_half_open_probe_retries_through_429_and_frees_slot(fresh_upstream, monkeypatch):
+    from clients.breaker import CircuitBreaker
+
+    def half_open_soon():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        breaker._opened_at -= 61  # reset_timeout истёк: следующий вызов — проба
+        monkeypatch.setattr(upstream, "breaker", breaker)
+        return breaker
+
+    breaker = half_open_soon()
+    with respx.mock:
+        route = respx.get(upstream.OPEN_METEO_URL).mock(side_effect=[
+            Response(429, headers={"Retry-After": "0"}),
+            Response(200, json=OPEN_METEO_SAMPLE),
+        ])
+        assert asyncio.run(upstream.fetch_weather(1.0, 2.0)) == OPEN_METEO_SAMPLE
+    assert route.call_count == 2
+    assert breaker.state == "closed"
+
+    breaker = half_open_soon()
+    with respx.mock:
+        respx.get(upstream.OPEN_METEO_URL).mock(side_effect=httpx.PoolTimeout("pool is full"))
+        with pytest.raises(httpx.PoolTimeout):
+            asyncio.run(upstream.fetch_weather(1.0, 2.0))
+    assert breaker.state == "half_open"
+    breaker.check()  # слот пробы освобождён — следующий запрос не ждёт reset_timeout
+
+
+def test_throttling_stub_upstream_is_retried_then_surfaced(fresh_upstream, monkeypatch):
+    async def scenario():
+        stub = await StubUpstream(throttle_rate=1.0, retry_after=0.01).start()
+        monkeypatch.setattr(upstream, "OPEN_METEO_URL", stub.url)
+        try:
+            with pytest.raises(httpx.HTTPStatusError):
+                await fresh_upstream.fetch_weather(1.0, 2.0)
+        finally:
+            await fresh_upstream.shutdown()
+            await stub.stop()
+        return stub.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["requests"] == stats["throttled"] == 3
+
+
+def _slow_first(delays):
+    """side_effect для respx: i-й запрос отвечает через delays[i] секунд."""
+    calls = iter(delays)
+
+    async def respond(request):
+        respond.started += 1  # respx считает только завершённые вызовы, а отменённые тоже нужны
+        await asyncio.sleep(next(calls, 0))
+        return Response(200, json=OPEN_METEO_SAMPLE)
+
+    respond.started = 0
+    return respond
+
+
+def _warm(hedger, latency=0.01, n=50):
+    for _ in range(n):
+        hedger.observe(latency)
+        hedger.on_request()
+
+
+def test_slow_attempt_is_hedged_and_fast_hedge_wins(fresh_upstream, monkeypatch):
+    monkeypatch.setattr(upstream, "hedger", Hedger(budget=0.5))
+    _warm(upstream.hedger)
+    with respx.mock:
+        slow = _slow_first([2.0, 0.0])
+        respx.get(upstream.OPEN_METEO_URL).mock(side_effect=slow)
+
+        async def timed():
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            raw = await upstream.fetch_weather(1.0, 2.0)
+            return raw, loop.time() - started
+
+        raw, elapsed = asyncio.run(timed())
+    assert raw == OPEN_METEO_SAMPLE and elapsed < 1.0
+    assert slow.started == 2
+    assert upstream.hedger.counters["fired"] == upstream.hedger.counters["won"] == 1
+    assert upstream.limiter.in_flight == 0  # слот хеджа возвращён
+
+
+def test_hedge_respects_budget(fresh_upstream, monkeypatch):
+    monkeypatch.setattr(upstream, "hedger", Hedger(budget=0.0))
+    _warm(upstream.hedger)
+    with respx.mock:
+        route = respx.get(upstream.OPEN_METEO_URL).mock(side_effect=_slow_first([0.2]))
+        asyncio.run(upstream.fetch_weather(1.0, 2.0))
+    assert route.call_count == 1
+    assert upstream.hedger.counters["no_budget"] == 1 and upstream.hedger.counters["fired"] == 0
+
+
+def test_attempt_deadlines_come_from_request_budget(fresh_upstream, monkeypatch):
+    monkeypatch.setattr(upstream, "REQUEST_BUDGET", 0.3)
+    monkeypatch.setattr(upstream, "hedger", Hedger(enabled=False))
+    with respx.mock:
+        slow = _slow_first([5.0, 5.0, 5.0])
+        respx.get(upstream.OPEN_METEO_URL).mock(side_effect=slow)
+
+        async def timed():
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            with pytest.raises(httpx.TimeoutException):
+                await upstream.fetch_weather(1.0, 2.0)
+            return loop.time() - started
+
+        elapsed = asyncio.run(timed())
+    assert elapsed < 0.6  # весь вызов укладывается в бюджет, а не в 3 x 5 с
+    assert slow.started >= 1  # backoff тоже тратит бюджет, поэтому попыток может быть меньше трёх
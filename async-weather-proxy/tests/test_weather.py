@@ -1,15 +1,52 @@
+import asyncio
 import copy
+import json
 import pytest
+import respx
 from fastapi.testclient import TestClient
-from httpx import AsyncClient
+from httpx import ASGITransport, AsyncClient, Response
 
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 import main
+from clients import weather as upstream
+from cache.keys import cell_of, make_key
+from bench import stub_upstream
 
-client = TestClient(main.app)
+OPEN_METEO_SAMPLE = {
+    "timezone": "Europe/Berlin",
+    "current": {"time": "2025-01-01T12:00", "temperature_2m": 3.4, "wind_speed_10m": 11.2},
+}
 
-def test_weather_ok():
+@pytest.fixture(autouse=True)
+def _fresh_breaker(monkeypatch):
+    # сбои одного теста не должны открывать цепь для следующих
+    monkeypatch.setattr(upstream, "breaker", upstream.CircuitBreaker())
+
+@pytest.fixture(scope="module")
+def stub():
+    # локальная заглушка Open-Meteo вместо реального API: тесты идут без сети
+    with stub_upstream.running() as server, pytest.MonkeyPatch.context() as mp:
+        mp.setattr(upstream, "OPEN_METEO_URL", server.url)
+        yield server
+
+@pytest.fixture(scope="module")
+def client(stub):
+    with TestClient(main.app) as c:
+        yield c
+
+@pytest.fixture
+def own_lifespan(monkeypatch):
+    # тест поднимает свой TestClient: его lifespan открывает и закрывает свой клиент апстрима,
+    # а клиент модульной фикстуры client остаётся открытым
+    monkeypatch.setattr(upstream, "_client", None)
+    monkeypatch.setattr(upstream, "_closed", False)
+
+def _proxy() -> AsyncClient:
+    # приложение без lifespan, внутри asyncio.run сценария: апстрим подменён через monkeypatch
+    return AsyncClient(transport=ASGITransport(app=main.app), base_url="http://proxy")
+
+def test_weather_ok(client):
     params = {"lat": 50.50, "lon": 45.45, "units": "metric"}
     r = client.get("/weather", params=params)
     assert r.status_code == 200, r.text
@@ -17,16 +54,18 @@ def test_weather_ok():
     assert "temperature" in data
     assert "wind_speed" in data
 
-def test_weather_cache_hit():
+def test_weather_cache_hit(client, stub):
     params = {"lat": 49.00, "lon": -12.50, "units": "metric"}
+    before = stub.requests
     r1 = client.get("/weather", params=params)
     assert r1.status_code == 200
 
     r2 = client.get("/weather", params=params)
     assert r2.status_code == 200
     assert r2.json()["cached"]
+    assert stub.requests - before == 1
 
-def test_weather_bad():
+def test_weather_bad(client):
     bad = {"lat": 50000, "lon": 50000, "units": "do-not-receive-it!!!!"}
     r = client.get("/weather", params=bad)
     assert r.status_code == 422
@@ -34,3 +73,566 @@ def test_weather_bad():
     assert "detail" in data
 
 
+
+def test_shared_client_lives_with_app(own_lifespan):
+    with respx.mock(assert_all_called=False) as mock:
+        mock.get(upstream.OPEN_METEO_URL).mock(return_value=Response(200, json=OPEN_METEO_SAMPLE))
+        with TestClient(main.app) as c:
+            shared = upstream._client
+            assert shared is not None
+            for lat in (10.1, 10.2, 10.3):
+                r = c.get("/weather", params={"lat": lat, "lon": 20.0})
+                assert r.status_code == 200, r.text
+            assert upstream._client is shared
+            assert mock.calls.call_count == 3
+        assert upstream._client is None
+
+def test_concurrent_misses_are_coalesced(monkeypatch):
+    calls = []
+
+    async def slow_fetch(lat, lon, units="metric"):
+        calls.append((lat, lon, units))
+        await asyncio.sleep(0.05)
+        return OPEN_METEO_SAMPLE
+
+    monkeypatch.setattr(main, "fetch_weather", slow_fetch)
+
+    async def scenario():
+        await main.cache.clear()
+        coalesced_before = main.inflight.coalesced
+        async with _proxy() as http:
+            responses = await asyncio.gather(*(http.get("/weather", params={"lat": 1.0, "lon": 2.0}) for _ in range(10)))
+        return [r.json() for r in responses], main.inflight.coalesced - coalesced_before
+
+    results, coalesced = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert coalesced == 9
+    assert all(r["temperature"] == 3.4 for r in results)
+
+def test_coalesced_errors_fan_out(monkeypatch):
+    async def failing_fetch(lat, lon, units="metric"):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(main, "fetch_weather", failing_fetch)
+
+    async def scenario():
+        await main.cache.clear()
+        async with _proxy() as http:
+            return await asyncio.gather(*(http.get("/weather", params={"lat": 3.0, "lon": 4.0}) for _ in range(3)))
+
+    responses = asyncio.run(scenario())
+    assert [r.status_code for r in responses] == [502] * 3
+    assert len(main.inflight) == 0
+
+def test_sweep_removes_only_expired():
+    async def scenario():
+        await main.cache.clear()
+        await main.cache.set("w:old", {"temperature": 1}, ttl_sec=-1)
+        await main.cache.set("w:new", {"temperature": 2}, ttl_sec=60)
+        listed = [k for k, _ in await main.cache.scan()]
+        removed = await main.cache.sweep()
+        return listed, removed, await main.cache.stats()
+
+    listed, removed, stats = asyncio.run(scenario())
+    assert listed == ["w:new"]
+    assert removed == 1
+    assert stats["size"] == 1
+
+def test_lru_eviction_respects_max_entries():
+    async def scenario():
+        await main.cache.clear()
+        main.cache.configure(max_entries=2, max_bytes=0)
+        try:
+            await main.cache.set("w:a", {"temperature": 1})
+            await main.cache.set("w:b", {"temperature": 2})
+            assert await main.cache.get("w:a") is not None  # a стал самым свежим
+            await main.cache.set("w:c", {"temperature": 3})
+            return await main.cache.get("w:b"), await main.cache.stats()
+        finally:
+            main.cache.configure()
+
+    evicted, stats = asyncio.run(scenario())
+    assert evicted is None
+    assert stats["size"] == 2
+    assert stats["evictions"] >= 1
+    assert stats["bytes"] > 0
+
+def test_stale_entry_served_and_refreshed_in_background(monkeypatch):
+    calls = []
+
+    async def fetch(lat, lon, units="metric"):
+        calls.append(lat)
+        return {**OPEN_METEO_SAMPLE, "current": {**OPEN_METEO_SAMPLE["current"], "temperature_2m": 9.9}}
+
+    monkeypatch.setattr(main, "fetch_weather", fetch)
+
+    async def scenario():
+        await main.cache.clear()
+        key = make_key(5.0, 6.0, "metric")
+        await main.cache.set(key, {"temperature": 1.0}, ttl_sec=-1, stale_ttl_sec=60)
+        async with _proxy() as http:
+            first = await http.get("/weather", params={"lat": 5.0, "lon": 6.0})
+            await asyncio.sleep(0.01)  # даём фоновому обновлению завершиться
+            second = await http.get("/weather", params={"lat": 5.0, "lon": 6.0})
+        return first.json(), second.json()
+
+    first, second = asyncio.run(scenario())
+    assert first["stale"] is True and first["temperature"] == 1.0
+    assert second["stale"] is False and second["temperature"] == 9.9
+    assert calls == [cell_of(5.0, 6.0)[0]]
+
+def test_refresh_ahead_uses_shared_ttl_and_hits(monkeypatch, tmp_path):
+    from cache.memory import MemoryCache
+    from cache.sqlite import SQLiteCache
+    from cache.tiered import TieredCache
+
+    calls = []
+
+    async def fetch(lat, lon, units="metric"):
+        calls.append(lat)
+        return OPEN_METEO_SAMPLE
+
+    monkeypatch.setattr(main, "fetch_weather", fetch)
+    monkeypatch.setitem(main.refreshes, "ahead", 0)
+    key = make_key(7.0, 8.0, "metric")
+
+    async def hammer(n):
+        async with _proxy() as http:
+            for _ in range(n):
+                assert (await http.get("/weather", params={"lat": 7.0, "lon": 8.0})).status_code == 200
+                await asyncio.sleep(0)
+
+    # tiered: копия в L1 живёт CACHE_L1_TTL, но свежесть берётся из L2 — горячий ключ не перезапрашивается
+    monkeypatch.setattr(main, "cache", TieredCache(MemoryCache(), SQLiteCache(str(tmp_path / "t.sqlite3"))))
+    asyncio.run(hammer(100))
+    assert len(calls) == 1 and main.refreshes["ahead"] == 0
+
+    # shared: попадания копятся между поисками, и близкий к истечению горячий ключ обновляется один раз
+    shared = SQLiteCache(str(tmp_path / "s.sqlite3"))
+    monkeypatch.setattr(main, "cache", shared)
+
+    async def near_expiry():
+        await shared.set(key, {"temperature": 1.0}, ttl_sec=main.REFRESH_AHEAD - 5, stale_ttl_sec=60)
+        await hammer(main.HOT_KEY_HITS + 1)
+
+    calls.clear()
+    asyncio.run(near_expiry())
+    assert len(calls) == 1 and main.refreshes["ahead"] == 1
+
+def test_nearby_coordinates_share_one_cell(monkeypatch):
+    calls = []
+
+    async def fetch(lat, lon, units="metric"):
+        calls.append((lat, lon))
+        return OPEN_METEO_SAMPLE
+
+    monkeypatch.setattr(main, "fetch_weather", fetch)
+
+    async def scenario():
+        await main.cache.clear()
+        async with _proxy() as http:
+            first = await http.get("/weather", params={"lat": 52.52001, "lon": 13.40501})
+            second = await http.get("/weather", params={"lat": 52.52004, "lon": 13.40497})  # GPS-дрожание в пару метров
+        return first.json(), second.json()
+
+    first, second = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert second["cached"] is True
+    assert first["cell"] == second["cell"] == {"lat": calls[0][0], "lon": calls[0][1]}
+    assert second["lat"] == 52.52004  # в ответе остаются координаты запроса
+
+def test_batch_groups_misses_into_multi_location_calls(monkeypatch, own_lifespan):
+    calls = []
+
+    async def fetch_many(points, units="metric"):
+        calls.append((len(points), units))
+        return [
+            {**OPEN_METEO_SAMPLE, "current": {**OPEN_METEO_SAMPLE["current"], "temperature_2m": lat}}
+            for lat, _ in points
+        ]
+
+    monkeypatch.setattr(main, "fetch_weather_many", fetch_many)
+    monkeypatch.setattr(main, "BATCH_CHUNK_SIZE", 50)
+    asyncio.run(main.cache.clear())
+
+    items = [{"lat": 10 + i * 0.1, "lon": 20.0, "units": "metric"} for i in range(120)]
+    items += [{"lat": 10.0, "lon": 20.0, "units": "imperial"}, items[0]]  # другой units + дубликат
+    with TestClient(main.app) as c:
+        r = c.post("/batch/weather", json={"items": items})
+    assert r.status_code == 200, r.text
+    data = r.json()
+    assert len(data) == 122
+    assert sorted(calls) == [(1, "imperial"), (20, "metric"), (50, "metric"), (50, "metric")]
+    assert data[5]["temperature"] == data[5]["cell"]["lat"]
+    assert data[-1]["temperature"] == data[0]["temperature"]
+
+def test_batch_reports_chunk_errors_per_item(monkeypatch, own_lifespan):
+    async def fetch_many(points, units="metric"):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(main, "fetch_weather_many", fetch_many)
+    asyncio.run(main.cache.clear())
+    with TestClient(main.app) as c:
+        r = c.post("/batch/weather", json={"items": [{"lat": 1.0, "lon": 1.0}, {"lat": 2.0, "lon": 2.0}]})
+    assert r.status_code == 200
+    assert [x["error"] for x in r.json()] == ["upstream down", "upstream down"]
+
+def test_open_circuit_fails_fast_with_503(client):
+    upstream.breaker.record_failure()
+    for _ in range(upstream.breaker.failure_threshold):
+        upstream.breaker.record_failure()
+    asyncio.run(main.cache.clear())
+    r = client.get("/weather", params={"lat": 33.3, "lon": 44.4})
+    assert r.status_code == 503
+    assert int(r.headers["Retry-After"]) > 0
+    assert client.get("/health/upstream").json()["breaker"]["state"] == "open"
+
+def test_batch_streams_ndjson_per_item(monkeypatch, own_lifespan):
+    async def fetch_many(points, units="metric"):
+        await asyncio.sleep(0.02 if units == "imperial" else 0)
+        return [OPEN_METEO_SAMPLE for _ in points]
+
+    monkeypatch.setattr(main, "fetch_weather_many", fetch_many)
+    asyncio.run(main.cache.clear())
+    items = [{"lat": 1.0, "lon": 1.0, "units": "imperial"}, {"lat": 2.0, "lon": 2.0}, {"lat": 2.0, "lon": 2.0}]
+    with TestClient(main.app) as c:
+        r = c.post("/batch/weather", json={"items": items}, headers={"Accept": "application/x-ndjson"})
+        sse = c.post("/batch/weather?stream=sse", json={"items": items[:1]})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [x["index"] for x in lines] == [1, 2, 0]  # медленная imperial-пачка приходит последней
+    assert sse.headers["content-type"].startswith("text/event-stream")
+    assert sse.text.startswith("data: {") and sse.text.endswith("\n\n")
+
+def test_stream_cancellation_cancels_own_chunks(monkeypatch):
+    async def fetch_many(points, units="metric"):
+        await asyncio.sleep(10)
+        return [OPEN_METEO_SAMPLE for _ in points]
+
+    monkeypatch.setattr(main, "fetch_weather_many", fetch_many)
+
+    async def scenario():
+        await main.cache.clear()
+        item = main.Coords(lat=7.0, lon=7.0)
+        key = make_key(7.0, 7.0, "metric")
+        gen = main._stream_batch([(item, key)], {key: (cell_of(7.0, 7.0), "metric")}, "ndjson")
+        consumer = asyncio.ensure_future(gen.__anext__())
+        await asyncio.sleep(0.01)
+        assert key in main.inflight
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        await gen.aclose()
+        await asyncio.sleep(0)
+        return key in main.inflight
+
+    assert asyncio.run(scenario()) is False
+
+def test_stream_cancellation_keeps_chunks_joined_by_batch(monkeypatch):
+    calls = []
+
+    async def fetch_many(points, units="metric"):
+        calls.append(len(points))
+        await asyncio.sleep(0.05)
+        return [OPEN_METEO_SAMPLE for _ in points]
+
+    monkeypatch.setattr(main, "fetch_weather_many", fetch_many)
+
+    async def scenario():
+        await main.cache.clear()
+        item = main.Coords(lat=8.0, lon=8.0)
+        key = make_key(8.0, 8.0, "metric")
+        wanted = {key: (cell_of(8.0, 8.0), "metric")}
+        gen = main._stream_batch([(item, key)], wanted, "ndjson")
+        consumer = asyncio.ensure_future(gen.__anext__())
+        await asyncio.sleep(0.01)
+        batch = asyncio.ensure_future(main._resolve_many(wanted))  # присоединяется к пачке стрима
+        await asyncio.sleep(0.01)
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        await gen.aclose()
+        out = await batch
+        return out[key], main.inflight.waiters(key)
+
+    fragment, waiters = asyncio.run(scenario())
+    assert "error" not in fragment
+    assert fragment["cached"] is False
+    assert calls == [1]
+    assert waiters == 0
+
+def test_snapshot_loop_survives_corrupt_file_and_failed_save(tmp_path, monkeypatch):
+    path = tmp_path / "cache.snapshot"
+    path.write_bytes(b"WCS1 not really a snapshot")
+    monkeypatch.setattr(main, "SNAPSHOT_PATH", str(path))
+    monkeypatch.setattr(main, "SNAPSHOT_INTERVAL", 0.01)
+    save = main.snapshot.save
+    saves = []
+
+    async def flaky_save(target, where):
+        saves.append(where)
+        if len(saves) == 1:
+            raise OSError(28, "No space left on device")
+        return await save(target, where)
+
+    monkeypatch.setattr(main.snapshot, "save", flaky_save)
+    errors = {step: main.metrics.SNAPSHOT_ERRORS.value(step) for step in ("load", "save")}
+
+    async def scenario():
+        target = main.MemoryCache()
+        await target.set("k", {"v": 1}, ttl_sec=60)
+        task = asyncio.create_task(main._snapshot_forever(target))
+        await asyncio.sleep(0.1)
+        alive = not task.done()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return alive, await main.snapshot.load(main.MemoryCache(), str(path))
+
+    alive, restored = asyncio.run(scenario())
+    assert alive
+    assert len(saves) > 1
+    assert restored == 1
+    assert main.metrics.SNAPSHOT_ERRORS.value("load") == errors["load"] + 1
+    assert main.metrics.SNAPSHOT_ERRORS.value("save") == errors["save"] + 1
+
+def test_shutdown_completes_when_final_snapshot_fails(tmp_path, monkeypatch, own_lifespan):
+    async def failing_save(target, where):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(main, "SNAPSHOT_PATH", str(tmp_path / "cache.snapshot"))
+    monkeypatch.setattr(main, "cache", main.MemoryCache())
+    monkeypatch.setattr(main.snapshot, "save", failing_save)
+    errors = main.metrics.SNAPSHOT_ERRORS.value("save")
+    with TestClient(main.app):
+        pass
+    assert main.metrics.SNAPSHOT_ERRORS.value("save") == errors + 1
+    assert upstream._client is None  # upstream.shutdown() всё равно отработал
+
+def test_metrics_endpoint_reports_latency_and_cache(client, monkeypatch):
+    async def fetch(lat, lon, units="metric"):
+        return OPEN_METEO_SAMPLE
+
+    monkeypatch.setattr(main, "fetch_weather", fetch)
+    client.get("/weather", params={"lat": 61.0, "lon": 11.0})
+    client.get("/weather", params={"lat": 61.0, "lon": 11.0})
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert 'weather_proxy_http_request_duration_seconds_count{method="GET",route="/weather",status="200"}' in body
+    assert 'weather_proxy_cache_hits_total{tier="memory"}' in body
+    assert 'weather_proxy_breaker_state{state="closed"} 1' in body
+
+def test_cache_hit_response_matches_full_serialization(client, monkeypatch):
+    async def fetch(lat, lon, units="metric"):
+        return OPEN_METEO_SAMPLE
+
+    monkeypatch.setattr(main, "fetch_weather", fetch)
+    params = {"lat": 62.5, "lon": 12.25, "units": "imperial"}
+    miss = client.get("/weather", params=params).json()
+    r = client.get("/weather", params=params)
+    assert r.headers["content-type"] == "application/json"
+    assert r.json() == {**miss, "cached": True}
+    assert list(r.json()) == list(miss)  # порядок полей тот же, что и у промаха
+
+def test_splice_handles_empty_data():
+    from responses import splice
+    assert json.loads(splice({"lat": 1.0}, b"{}", True, True)) == {"lat": 1.0, "cached": True, "stale": True}
+
+def test_weather_etag_and_304(client, monkeypatch):
+    async def fetch(lat, lon, units="metric"):
+        return OPEN_METEO_SAMPLE
+
+    monkeypatch.setattr(main, "fetch_weather", fetch)
+    params = {"lat": 63.0, "lon": 14.0}
+    first = client.get("/weather", params=params)
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"].startswith(f"max-age={main.CACHE_TTL}")
+
+    r = client.get("/weather", params=params, headers={"If-None-Match": f'"other", {etag}'})
+    assert r.status_code == 304 and r.content == b""
+    assert r.headers["etag"] == etag
+    assert 0 < int(r.headers["cache-control"].split(",")[0].removeprefix("max-age=")) <= main.CACHE_TTL
+
+    assert client.get("/weather", params=params, headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_cache_entry_conditional_get(client, monkeypatch):
+    async def fetch(lat, lon, units="metric"):
+        return OPEN_METEO_SAMPLE
+
+    monkeypatch.setattr(main, "fetch_weather", fetch)
+    client.get("/weather", params={"lat": 64.0, "lon": 15.0})
+    key = make_key(64.0, 15.0, "metric")
+    listed = next(item for item in client.get("/cache/weather").json() if item["key"] == key)
+
+    entry = asyncio.run(main.cache.peek(key))
+    hits, stats = entry.hits, asyncio.run(main.cache.stats())
+    r = client.get(f"/cache/weather/{key}")
+    assert r.status_code == 200 and r.headers["etag"] == listed["etag"]
+    assert client.get(f"/cache/weather/{key}", headers={"If-None-Match": listed["etag"]}).status_code == 304
+    assert client.get("/cache/weather/w:missing").status_code == 404
+    # просмотр записи не считается попаданием и не копит hits для refresh-ahead
+    assert entry.hits == hits
+    assert asyncio.run(main.cache.stats())["hits"] == stats["hits"]
+
+def test_cache_listing_pages_filters_and_streams(client):
+    async def fill():
+        await main.cache.clear()
+        for i in range(7):
+            await main.cache.set(f"w:{40 + i}.0:{i}.0:metric", {"temperature": i}, ttl_sec=60)
+        await main.cache.set("w:1.0:1.0:imperial", {"temperature": -1}, ttl_sec=60)
+
+    client.portal.call(fill)
+    r = client.get("/cache/weather", params={"limit": 3, "units": "metric"})
+    keys = [e["key"] for e in r.json()]
+    assert keys == ["w:40.0:0.0:metric", "w:41.0:1.0:metric", "w:42.0:2.0:metric"]
+    assert r.headers["x-next-cursor"] == keys[-1] and 'rel="next"' in r.headers["link"]
+
+    nxt = client.get("/cache/weather", params={"limit": 3, "units": "metric", "cursor": r.headers["x-next-cursor"]})
+    assert [e["key"] for e in nxt.json()][0] == "w:43.0:3.0:metric"
+    assert client.get("/cache/weather", params={"bbox": "0,0,2,2"}).json()[0]["temperature"] == -1
+    assert client.get("/cache/weather", params={"bbox": "nope"}).status_code == 422
+
+    streamed = client.get("/cache/weather", params={"stream": "ndjson", "units": "metric"})
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert len(lines) == 7 and all("etag" in line for line in lines)
+
+def test_cache_stats_do_not_enumerate_entries(client, monkeypatch):
+    def boom(*args, **kwargs):
+        raise AssertionError("stats must not walk the cache")
+
+    monkeypatch.setattr(main.cache, "scan", boom)
+    monkeypatch.setattr(main.cache, "iter_entries", boom)
+    stats = client.get("/cache/weather/stats").json()
+    assert {"size", "hits", "misses", "inflight"} <= set(stats)
+
+FORECAST_SAMPLE = {
+    **OPEN_METEO_SAMPLE,
+    "utc_offset_seconds": 3600,  # время в hourly — локальное (UTC+1)
+    "hourly": {
+        "time": [f"2025-01-01T{h:02d}:00" for h in range(6)],
+        "temperature_2m": [1.5, 2.0, None, 3.25, 4.0, 4.5],
+        "wind_speed_10m": [10.0, 11.0, 12.0, 13.0, 14.0, 15.0],
+    },
+}
+
+def test_forecast_slices_window_and_variables(client, monkeypatch):
+    calls = []
+
+    async def fetch(lat, lon, units="metric", hourly=(), forecast_days=None):
+        calls.append(list(hourly))
+        return FORECAST_SAMPLE
+
+    monkeypatch.setattr(main, "fetch_weather", fetch)
+    # 00:00 UTC = 01:00 локального времени
+    params = {"lat": 65.0, "lon": 16.0, "start": "2025-01-01T00:00:00Z", "hours": 3, "variables": "temperature"}
+    r = client.get("/forecast", params=params)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["time"] == [1735689600, 1735693200, 1735696800]
+    assert body["hourly"] == {"temperature": [2.0, None, 3.25]}
+    assert body["cached"] is False
+
+    again = client.get("/forecast", params={**params, "variables": "temperature,wind_speed", "end": "2025-01-01T02:00:00Z"}).json()
+    assert again["cached"] is True and again["hourly"] == {"temperature": [2.0, None], "wind_speed": [11.0, 12.0]}
+    assert len(calls) == 1 and "temperature_2m" in calls[0]
+
+    assert client.get("/forecast", params={**params, "variables": "snow"}).status_code == 422
+
+def test_hourly_series_slices_share_buffers():
+    series = upstream.normalize_hourly(FORECAST_SAMPLE)
+    times, columns = series.slice(0, 2**62, ["wind_speed"])
+    assert times.obj is series.times and columns["wind_speed"].obj is series.columns["wind_speed"]
+    assert columns["wind_speed"].itemsize == 4 and len(series) == 6
+
+def _fresh_prefetcher(monkeypatch, **kw):
+    from prefetch import Prefetcher
+    p = Prefetcher(main.cache, main._prefetch_many, upstream, chunk_size=main.BATCH_CHUNK_SIZE, **kw)
+    monkeypatch.setattr(main, "prefetcher", p)
+    return p
+
+def test_prefetch_refreshes_due_keys_within_budget(monkeypatch):
+    calls = []
+
+    async def fetch_many(points, units="metric"):
+        calls.append(len(points))
+        return [OPEN_METEO_SAMPLE for _ in points]
+
+    monkeypatch.setattr(main, "fetch_weather_many", fetch_many)
+    monkeypatch.setattr(main, "BATCH_CHUNK_SIZE", 2)
+    monkeypatch.setattr(upstream, "limiter", upstream.UpstreamLimiter(rate=1.0))
+    p = _fresh_prefetcher(monkeypatch, interval=1.0, share=1.0)
+    p.chunk_size = 2
+    p.configure(locations=[(10.0 + i, 20.0, "metric") for i in range(5)])
+
+    async def scenario():
+        await main.cache.clear()
+        fresh = main.cell_key(main.cell_of(10.0, 20.0), "metric")
+        await main.cache.set(fresh, {"temperature": 1}, ttl_sec=3600)
+        first = await p.run_once()  # 1 запрос на цикл -> одна пачка из 2 ключей, свежий ключ пропущен
+        second = await p.run_once()
+        third = await p.run_once()  # всё тёплое
+        return first, second, third, await main.cache.peek(main.cell_key(main.cell_of(14.0, 20.0), "metric"))
+
+    first, second, third, entry = asyncio.run(scenario())
+    assert (first, second, third) == (2, 2, 0)
+    assert calls == [2, 2] and entry is not None
+    assert p.counters["deferred"] == 2 and main.refreshes["prefetch"] >= 4
+
+def test_prefetch_skips_while_circuit_open(monkeypatch):
+    async def fetch_many(points, units="metric"):
+        raise AssertionError("prefetch must not call upstream with an open circuit")
+
+    monkeypatch.setattr(main, "fetch_weather_many", fetch_many)
+    p = _fresh_prefetcher(monkeypatch)
+    p.configure(locations=[(11.5, 21.5, "metric")])
+    for _ in range(upstream.breaker.failure_threshold + 1):
+        upstream.breaker.record_failure()
+    assert asyncio.run(p.run_once()) == 0
+    assert p.counters["skipped_cycles"] == 1
+
+def test_prefetch_endpoint_adjusts_warm_set(client, monkeypatch):
+    async def fetch_many(points, units="metric"):
+        return [OPEN_METEO_SAMPLE for _ in points]
+
+    monkeypatch.setattr(main, "fetch_weather_many", fetch_many)
+    _fresh_prefetcher(monkeypatch, top_n=1)
+    client.get("/weather", params={"lat": 70.0, "lon": 17.0})
+
+    body = {"locations": [{"lat": 71.0, "lon": 18.0}], "bboxes": [{"min_lat": 0, "min_lon": 0, "max_lat": 0.02, "max_lon": 0.02}]}
+    r = client.patch("/prefetch", json=body)
+    assert r.status_code == 200, r.text
+    state = r.json()
+    assert state["static_keys"] >= 2 and state["warm_keys"] == state["static_keys"] + 1
+    listed = client.get("/prefetch", params={"keys": 100}).json()["keys"]
+    assert make_key(71.0, 18.0, "metric") in listed and make_key(70.0, 17.0, "metric") in listed
+
+    state = client.patch("/prefetch", json={"run": True}).json()
+    assert state["refreshed"] == state["static_keys"]  # ключ из трафика уже свежий
+    assert client.get("/weather", params={"lat": 71.0, "lon": 18.0}).json()["cached"] is True
+
+    huge = {"bboxes": [{"min_lat": -80, "min_lon": -170, "max_lat": 80, "max_lon": 170}]}
+    assert client.patch("/prefetch", json=huge).status_code == 422
+    before = client.get("/prefetch", params={"keys": 100}).json()
+    inverted = {"min_lat": 80, "min_lon": 0, "max_lat": -80, "max_lon": 10}
+    hidden = {"bboxes": [{"min_lat": 0, "min_lon": 0, "max_lat": 20, "max_lon": 20}, inverted]}
+    assert client.patch("/prefetch", json=hidden).status_code == 422
+    # отклонённый PATCH не меняет ничего, в том числе переданные вместе с ним точки
+    too_many = {"locations": [{"lat": 72.0, "lon": 19.0}], "bboxes": [{"min_lat": -80, "min_lon": -170, "max_lat": 80, "max_lon": 170}]}
+    assert client.patch("/prefetch", json=too_many).status_code == 422
+    assert client.get("/prefetch", params={"keys": 100}).json() == before
+
+def test_prefetch_caps_points_and_rejects_inverted_bboxes(monkeypatch):
+    import prefetch
+
+    monkeypatch.setattr(prefetch, "PREFETCH_MAX_KEYS", 3)
+    p = _fresh_prefetcher(monkeypatch)
+    with pytest.raises(ValueError):
+        p.configure(locations=[(float(i), 0.0, "metric") for i in range(4)])
+    with pytest.raises(ValueError):
+        prefetch.parse_bboxes("10,0,-10,5")
+    with pytest.raises(ValueError):
+        p.configure(bboxes=[((10.0, 0.0, -10.0, 5.0), "metric")])
+    assert prefetch.grid_size((10.0, 0.0, -10.0, 5.0)) == 0
+    assert p.locations == [] and p.bboxes == []
@@ -0,0 +1,58 @@
+"""
+Cost of one GET /bookmarks page as the collection grows: the old copy + sort
+vs the lazy newest-first walk, for the first page and a deep page reached by
+skip vs by the after_id cursor.
+
+    python bench/bench_listing.py --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import BookmarkStore  # noqa: E402
+
+LIMIT = 10
+
+
+def copy_sort(store, skip):
+    items = sorted(list(store), key=lambda t: t["id"], reverse=True)
+    return items[skip : skip + LIMIT]
+
+
+def walk_skip(store, skip):
+    return list(islice(store.newest(), skip, skip + LIMIT))
+
+
+def walk_after(store, after_id):
+    return list(islice(store.newest(after_id), LIMIT))
+
+
+def timed(fn, *args, repeat=20) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - started) / repeat * 1e3
+
+
+def main(sizes):
+    print(f"{'size':>9} {'copy+sort ms':>13} {'first page ms':>14} {'deep skip ms':>13} {'deep after_id ms':>17}")
+    for size in sizes:
+        store = BookmarkStore()
+        for i in range(1, size + 1):
+            store.add({"id": i, "title": "t", "notes": None, "tags": [], "favorite": False})
+        deep = size // 2
+        print(
+            f"{size:>9} {timed(copy_sort, store, 0, repeat=3):>13.3f} {timed(walk_skip, store, 0):>14.4f}"
+            f" {timed(walk_skip, store, deep, repeat=3):>13.3f} {timed(walk_after, store, size - deep):>17.4f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    main(args.sizes)
@@ -0,0 +1,104 @@
+"""
+Latency of GET /bookmarks?q=... style search as the collection grows:
+a substring scan over every title and note vs the n-gram index, and the
+memory the index takes per bookmark (traced allocations of a TextIndex
+built over the same records).
+
+    python bench/bench_search.py --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import TextIndex  # noqa: E402
+from store import BookmarkStore  # noqa: E402
+
+COMMON = (
+    "python async fastapi database postgres redis cache index search query tutorial guide "
+    "reference docs blog video course linux kernel network http api rest graph design"
+).split()
+RARE = [f"zq{i:04d}" for i in range(5000)]
+
+
+def make_text(rnd: random.Random, words: int) -> str:
+    return " ".join(rnd.choice(COMMON) if rnd.random() < 0.7 else rnd.choice(RARE) for _ in range(words))
+
+
+def scan(store: BookmarkStore, q: str) -> list:
+    needle = q.lower()
+    items = [
+        t for t in store
+        if needle in t["title"].lower() or (t["notes"] or "").lower().find(needle) != -1
+    ]
+    return sorted(items, key=lambda t: t["id"], reverse=True)[:10]
+
+
+def indexed(store: BookmarkStore, q: str) -> list:
+    # the same decision list_bookmarks makes
+    text = store.text
+    ids = text.search(q)
+    if ids is None:
+        needle = q.lower()
+        return list(islice((t for t in reversed(store) if text.matches(t["id"], needle)), 10))
+    return [store.get(i) for i in sorted(ids, reverse=True)[:10]]
+
+
+def index_bytes(records: dict) -> float:
+    """Bytes per record held by a TextIndex over records."""
+    tracemalloc.start()
+    try:
+        index = TextIndex(records)
+        for bookmark_id, record in records.items():
+            index.add(bookmark_id, record)
+        return tracemalloc.get_traced_memory()[0] / max(len(records), 1)
+    finally:
+        tracemalloc.stop()
+
+
+def timed(fn, store, queries) -> float:
+    started = time.perf_counter()
+    for q in queries:
+        fn(store, q)
+    return (time.perf_counter() - started) / len(queries) * 1e3
+
+
+def main(sizes, queries, scan_limit, title_words, notes_words):
+    rnd = random.Random(42)
+    print(f"{'size':>9} {'query':>10} {'scan ms':>10} {'index ms':>10}")
+    for size in sizes:
+        store = BookmarkStore()
+        for i in range(1, size + 1):
+            store.add({
+                "id": i,
+                "title": f"item{i} {make_text(rnd, title_words)}",
+                "notes": make_text(rnd, notes_words),
+                "tags": [],
+            })
+        print(f"{size:>9} {'memory':>10} {'':>10} {index_bytes(store._by_id):>7.0f} B/bookmark")
+        cases = {
+            "one hit": [f"item{rnd.randint(1, size)} " for _ in range(queries)],
+            "rare word": [rnd.choice(RARE) for _ in range(queries)],
+            "common": [rnd.choice(COMMON) for _ in range(queries)],
+            "short": ["py"] * queries,
+            "short rare": [f"{rnd.randint(0, 9)}{rnd.choice('xjv')}" for _ in range(queries)],
+        }
+        for name, qs in cases.items():
+            scan_ms = f"{timed(scan, store, qs[:3]):10.2f}" if size <= scan_limit else f"{'-':>10}"
+            print(f"{size:>9} {name:>10} {scan_ms} {timed(indexed, store, qs):10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-limit", type=int, default=1_000_000)
+    parser.add_argument("--title-words", type=int, default=3)
+    parser.add_argument("--notes-words", type=int, default=12)
+    args = parser.parse_args()
+    main(args.sizes, args.queries, args.scan_limit, args.title_words, args.notes_words)
@@ -0,0 +1,97 @@
+"""
+Cost of get / patch / put / delete by id as the collection grows:
+the old list with linear scans vs BookmarkStore.
+
+    python bench/bench_store.py --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import BookmarkStore  # noqa: E402
+
+
+class ListStore:
+    """The previous layout: a plain list, every lookup is a scan."""
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, record):
+        self.items.append(record)
+
+    def _index(self, bookmark_id):
+        for i, t in enumerate(self.items):
+            if t["id"] == bookmark_id:
+                return i
+        return -1
+
+    def get(self, bookmark_id):
+        idx = self._index(bookmark_id)
+        return self.items[idx] if idx != -1 else None
+
+    def update(self, bookmark_id, fields):
+        self.items[self._index(bookmark_id)].update(fields)
+
+    def replace(self, bookmark_id, record):
+        self.items[self._index(bookmark_id)] = record
+
+    def remove(self, bookmark_id):
+        self.items.pop(self._index(bookmark_id))
+
+
+def record(i):
+    return {"id": i, "title": f"bookmark {i}", "url": "https://example.com/", "tags": [], "notes": None}
+
+
+def measure(store, size, ops, rnd):
+    ids = [rnd.randint(1, size) for _ in range(ops)]
+    timings = {}
+    started = time.perf_counter()
+    for i in ids:
+        store.get(i)
+    timings["get"] = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in ids:
+        store.update(i, {"notes": "x"})
+    timings["patch"] = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in ids:
+        store.replace(i, record(i))
+    timings["put"] = time.perf_counter() - started
+    victims = rnd.sample(range(1, size + 1), ops)
+    started = time.perf_counter()
+    for i in victims:
+        store.remove(i)
+    timings["delete"] = time.perf_counter() - started
+    return {op: t / ops * 1e6 for op, t in timings.items()}
+
+
+def main(sizes, ops, list_limit):
+    rnd = random.Random(42)
+    print(f"{'size':>9} {'layout':>6} {'get µs':>10} {'patch µs':>10} {'put µs':>10} {'delete µs':>10}")
+    for size in sizes:
+        layouts = [("dict", BookmarkStore)]
+        if size <= list_limit:
+            layouts.append(("list", ListStore))
+        for name, factory in layouts:
+            store = factory()
+            for i in range(1, size + 1):
+                store.add(record(i))
+            # a few ops are enough to see the O(n) of the list at large sizes
+            n = ops if name == "dict" else max(min(ops, 2_000_000 // size), 3)
+            us = measure(store, size, n, rnd)
+            print(f"{size:>9} {name:>6} {us['get']:>10.2f} {us['patch']:>10.2f} {us['put']:>10.2f} {us['delete']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=1000)
+    parser.add_argument("--list-limit", type=int, default=1_000_000, help="skip the list layout above this size")
+    args = parser.parse_args()
+    main(args.sizes, args.ops, args.list_limit)
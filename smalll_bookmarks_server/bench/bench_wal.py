@@ -0,0 +1,111 @@
+"""
+Bookmark writes per second under each fsync policy, with concurrent writers
+(as under uvicorn's threadpool), and how long startup replay takes.
+
+    python bench/bench_wal.py --threads 1 16 --seconds 3 --replay 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persistence import POLICIES, Journal  # noqa: E402
+from store import BookmarkStore  # noqa: E402
+
+
+def record(i: int) -> dict:
+    return {
+        "id": i, "title": f"bookmark {i}", "url": "https://example.com/", "tags": ["bench"],
+        "favorite": False, "notes": "some notes", "created_at": datetime.utcnow(),
+    }
+
+
+def run(policy: str, threads: int, seconds: float, directory: str) -> dict:
+    store = BookmarkStore()
+    journal = Journal(store, directory, policy=policy, compact_every=10**9)
+    journal.open()
+    next_id = [1]
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    def writer():
+        mine = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            with journal.write() as txn:
+                rec = record(next_id[0])
+                next_id[0] += 1
+                txn.put(rec)
+                store.add(rec)
+            mine.append(time.perf_counter() - started)
+        latencies.extend(mine)
+
+    workers = [threading.Thread(target=writer) for _ in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    fsyncs = journal.wal.fsyncs
+    journal.close()
+    latencies.sort()
+    return {
+        "writes/s": len(latencies) / elapsed,
+        "p50 ms": latencies[len(latencies) // 2] * 1e3,
+        "p99 ms": latencies[int(len(latencies) * 0.99)] * 1e3,
+        "writes/fsync": len(latencies) / max(fsyncs, 1),
+    }
+
+
+def replay(count: int, directory: str) -> tuple[float, float]:
+    store = BookmarkStore()
+    journal = Journal(store, directory, policy="never", compact_every=10**9)
+    journal.open()
+    for i in range(1, count + 1):
+        with journal.write() as txn:
+            rec = record(i)
+            txn.put(rec)
+            store.add(rec)
+    journal.close()
+
+    started = time.perf_counter()
+    fresh = Journal(BookmarkStore(), directory, policy="never")
+    fresh.open()
+    from_log = time.perf_counter() - started
+    fresh.compact()
+    fresh.close()
+
+    started = time.perf_counter()
+    Journal(BookmarkStore(), directory, policy="never").open()
+    return from_log, time.perf_counter() - started
+
+
+def main(threads_list, seconds, replay_count):
+    print(f"{'policy':>9} {'threads':>7} {'writes/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'writes/fsync':>13}")
+    for policy in POLICIES:
+        for threads in threads_list:
+            with tempfile.TemporaryDirectory() as directory:
+                r = run(policy, threads, seconds, directory)
+            print(
+                f"{policy:>9} {threads:>7} {r['writes/s']:>10.0f} {r['p50 ms']:>8.3f} {r['p99 ms']:>8.3f}"
+                f" {r['writes/fsync']:>13.1f}"
+            )
+    if replay_count:
+        with tempfile.TemporaryDirectory() as directory:
+            from_log, from_snapshot = replay(replay_count, directory)
+        print(f"startup with {replay_count} bookmarks: log replay {from_log:.2f} s, snapshot {from_snapshot:.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--replay", type=int, default=100_000, help="bookmarks for the startup replay test (0 = skip)")
+    args = parser.parse_args()
+    main(args.threads, args.seconds, args.replay)
@@ -1,14 +1,30 @@
 from fastapi import FastAPI, HTTPException, status
 from pydantic import BaseModel, Field, HttpUrl, field_validator
-from typing import Optional, List
+from typing import Optional, List, Literal, Tuple
 from fastapi import Query
 from datetime import datetime
+from itertools import islice
+import heapq
+from contextlib import asynccontextmanager
 from fastapi.responses import Response
+from store import BookmarkStore
+from persistence import Journal
 
-app = FastAPI()
-
-BOOKMARKS: List[dict] = []
+BOOKMARKS = BookmarkStore()
 NEXT_ID = 1
+JOURNAL = Journal(BOOKMARKS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global NEXT_ID
+    # replays snapshot + log when BOOKMARKS_DATA_DIR is set
+    NEXT_ID = max(NEXT_ID, JOURNAL.open())
+    try:
+        yield
+    finally:
+        JOURNAL.close()
+
+app = FastAPI(lifespan=lifespan)
 
 class BookmarkCreate(BaseModel):
     title: str = Field(..., min_length=1, max_length=120)
@@ -56,6 +72,10 @@ class BookmarkOut(BaseModel):
     notes: Optional[str] = None
     created_at: datetime
 
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
 class BookmarkUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=1, max_length=120)
     url: Optional[HttpUrl] = None
@@ -130,12 +150,6 @@ class BookmarkReplace(BaseModel):
 
         return unique
 
-def _find_bookmark_index(bookmark_id: int) -> int:
-    for i, t in enumerate(BOOKMARKS):
-        if t["id"] == bookmark_id:
-            return i
-    return -1
-
 @app.get("/")
 def root():
     return "Here you can find saved bookmarks and manage them however you want"
@@ -143,84 +157,142 @@ def root():
 @app.post("/bookmarks", response_model=BookmarkOut, status_code=status.HTTP_201_CREATED)
 def create_bookmark(payload: BookmarkCreate):
     global NEXT_ID
-    bookmark = {
-        "id": NEXT_ID,
-        "title": payload.title,
-        "url": str(payload.url),
-        "tags": payload.tags,
-        "favorite": False,
-        "notes": payload.notes,
-        "created_at": datetime.utcnow(),
-    }
-    BOOKMARKS.append(bookmark)
-    NEXT_ID += 1
+    with JOURNAL.write() as txn:
+        bookmark = {
+            "id": NEXT_ID,
+            "title": payload.title,
+            "url": str(payload.url),
+            "tags": payload.tags,
+            "favorite": False,
+            "notes": payload.notes,
+            "created_at": datetime.utcnow(),
+        }
+        txn.put(bookmark)
+        BOOKMARKS.add(bookmark)
+        NEXT_ID += 1
     return bookmark
 
+def _parse_tags(tags: Optional[str]) -> List[str]:
+    return [t for t in (t.strip().lower() for t in (tags or "").split(",")) if t]
+
 @app.get("/bookmarks", response_model=List[BookmarkOut])
 def list_bookmarks(
+    response: Response,
     q: Optional[str] = Query(None, min_length=1, max_length=120),
+    tags: Optional[str] = Query(None, description="comma-separated tags"),
+    tags_match: Literal["any", "all"] = "any",
+    favorite: Optional[bool] = None,
+    after_id: Optional[int] = Query(None, ge=1, description="keyset cursor: id of the last bookmark of the previous page"),
     skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100)
+    limit: int = Query(10, ge=1, le=100),
+    order: Literal["newest", "relevance"] = "newest",
 ):
-    items = BOOKMARKS.copy()
-
+    page, last_id = _list_page(q, tags, tags_match, favorite, after_id, skip, limit, order)
+    # with the newest-first order the next page starts below the last id
+    if last_id is not None and not (q and order == "relevance"):
+        response.headers["X-Next-After-Id"] = str(last_id)
+    return page
+
+def _list_page(q, tags, tags_match, favorite, after_id, skip, limit, order) -> Tuple[List[dict], Optional[int]]:
+    text, tag_index = BOOKMARKS.text, BOOKMARKS.tags
+    # filters the indexes answer as id sets, and the rest as checks on each id
+    sets = []
+    checks = []
     if q:
         needle = q.lower()
-        items = [
-            t for t in items
-            if needle in t["title"].lower()
-            or (t["notes"] or "").lower().find(needle) != -1
-        ]
-
-    items = sorted(items, key=lambda t: t["id"], reverse=True)
-
-    return items[skip : skip + limit]
+        ids = text.search(q)
+        if ids is None:
+            checks.append(lambda i: text.matches(i, needle))
+        else:
+            sets.append(ids)
+    wanted_tags = _parse_tags(tags)
+    if wanted_tags:
+        sets.append(tag_index.ids(wanted_tags, tags_match))
+    if favorite is True:
+        # a copy: handlers run in a threadpool and writers change the live set
+        sets.append(set(tag_index.favorites))
+    elif favorite is False:
+        checks.append(lambda i: i not in tag_index.favorites)
+
+    if not sets:
+        # nothing narrows the set down, so the filters (if any) match a good share
+        # of bookmarks and a newest-first walk reaches skip + limit hits quickly
+        matched = (t for t in BOOKMARKS.newest(after_id) if all(c(t["id"]) for c in checks))
+        if not (q and order == "relevance"):
+            page = list(islice(matched, skip, skip + limit))
+            return page, page[-1]["id"] if len(page) == limit else None
+        ids = [t["id"] for t in matched]
+    else:
+        if after_id is not None:
+            checks.append(lambda i: i < after_id)
+        sets.sort(key=len)
+        ids = [i for i in sets[0] if all(i in other for other in sets[1:]) and all(c(i) for c in checks)]
+
+    if q and order == "relevance":
+        ids = text.rank(ids, q)[skip : skip + limit]
+    else:
+        ids = heapq.nlargest(skip + limit, ids)[skip:]
+    # a bookmark deleted by a concurrent request since its id was picked is skipped,
+    # but the cursor still points past it: a short page is not the last one
+    records = (BOOKMARKS.get(i) for i in ids)
+    return [t for t in records if t is not None], ids[-1] if len(ids) == limit else None
+
+@app.get("/tags", response_model=List[TagCount])
+def list_tags(limit: Optional[int] = Query(None, ge=1)):
+    counts = BOOKMARKS.tags.counts()
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return [{"tag": tag, "count": count} for tag, count in ranked[:limit]]
 
 @app.get("/bookmarks/{bookmark_id}", response_model=BookmarkOut)
 def get_bookmark(bookmark_id: int):
-    for t in BOOKMARKS:
-        if t["id"] == bookmark_id:
-            return t
-    raise HTTPException(status_code=404, detail="Bookmark not found")
+    bookmark = BOOKMARKS.get(bookmark_id)
+    if bookmark is None:
+        raise HTTPException(status_code=404, detail="Bookmark not found")
+    return bookmark
 
 @app.patch("/bookmarks/{bookmark_id}", response_model=BookmarkOut)
 def patch_bookmark(bookmark_id: int, payload: BookmarkUpdate):
-    idx = _find_bookmark_index(bookmark_id)
-    if idx == -1:
-        raise HTTPException(status_code=404, detail="Bookmark not found")
-
     data = payload.model_dump(exclude_unset=True)
 
-    BOOKMARKS[idx].update(data)
-    return BOOKMARKS[idx]
+    with JOURNAL.write() as txn:
+        current = BOOKMARKS.get(bookmark_id)
+        if current is None:
+            raise HTTPException(status_code=404, detail="Bookmark not found")
+        bookmark = {**current, **data}
+        txn.put(bookmark)
+        BOOKMARKS.replace(bookmark_id, bookmark)
+    return bookmark
 
 
 @app.put("/bookmarks/{bookmark_id}", response_model=BookmarkOut)
 def put_bookmark(bookmark_id: int, payload: BookmarkReplace):
-    idx = _find_bookmark_index(bookmark_id)
-    if idx == -1:
-        raise HTTPException(status_code=404, detail="Bookmark not found")
-
-    preserved = {
-        "id": BOOKMARKS[idx]["id"],
-        "created_at": BOOKMARKS[idx]["created_at"],
-    }
-
-    BOOKMARKS[idx] = {
-        **preserved,
-        "title": payload.title,
-        "url": payload.url,
-        "favorite": payload.favorite,
-        "tags": payload.tags,
-        "notes": payload.notes,
-    }
-
-    return BOOKMARKS[idx]
+    with JOURNAL.write() as txn:
+        current = BOOKMARKS.get(bookmark_id)
+        if current is None:
+            raise HTTPException(status_code=404, detail="Bookmark not found")
+
+        preserved = {
+            "id": current["id"],
+            "created_at": current["created_at"],
+        }
+
+        bookmark = {
+            **preserved,
+            "title": payload.title,
+            "url": payload.url,
+            "favorite": payload.favorite,
+            "tags": payload.tags,
+            "notes": payload.notes,
+        }
+        txn.put(bookmark)
+        BOOKMARKS.replace(bookmark_id, bookmark)
+    return bookmark
 
 @app.delete("/bookmarks/{bookmark_id}", response_model=BookmarkOut)
 def delete_bookmark(bookmark_id: int):
-    idx = _find_bookmark_index(bookmark_id)
-    if idx == -1:
-        raise HTTPException(status_code=404, detail="Bookmark not found")
-    BOOKMARKS.pop(idx)
+    with JOURNAL.write() as txn:
+        if bookmark_id not in BOOKMARKS:
+            raise HTTPException(status_code=404, detail="Bookmark not found")
+        txn.delete(bookmark_id)
+        BOOKMARKS.remove(bookmark_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
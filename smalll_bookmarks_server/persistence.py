@@ -0,0 +1,344 @@
+"""
+Durable bookmarks without a database round-trip: the store stays in memory and
+every mutation is appended to a write-ahead log; the log is periodically folded
+into a snapshot.
+
+    data/
+        snapshot.jsonl        header {"max_id", "wal"} + one record per line
+        wal-000003.log        "<crc32> <json op>" per line
+
+Fsync policies (BOOKMARKS_FSYNC):
+    always    fsync after every write, before the response; one fsync per write
+    group     group commit: a write waits until it is fsynced, but one fsync
+              covers every write appended while the previous one was running
+    interval  fsync every BOOKMARKS_FSYNC_INTERVAL seconds in the background;
+              a crash loses at most that window
+    never     leave it to the OS; survives a process crash, not a power loss
+"""
+import json
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from store import BookmarkStore
+
+DATA_DIR = os.getenv("BOOKMARKS_DATA_DIR", "")  # empty = in memory only
+FSYNC_POLICY = os.getenv("BOOKMARKS_FSYNC", "group")
+FSYNC_INTERVAL = float(os.getenv("BOOKMARKS_FSYNC_INTERVAL", "1.0"))
+COMPACT_EVERY = int(os.getenv("BOOKMARKS_COMPACT_EVERY", "100000"))  # log ops between snapshots
+
+POLICIES = ("always", "group", "interval", "never")
+SNAPSHOT = "snapshot.jsonl"
+
+
+def _encode(obj: dict) -> bytes:
+    # datetime and HttpUrl go through str(); datetime.fromisoformat reads them back
+    payload = json.dumps(obj, default=str, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def _decode(line: bytes) -> Optional[dict]:
+    """One log line, or None if it is torn or corrupt."""
+    crc, _, payload = line.rstrip(b"\n").partition(b" ")
+    try:
+        if int(crc, 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+def _record(data: dict) -> dict:
+    data["created_at"] = datetime.fromisoformat(data["created_at"])
+    return data
+
+
+def _segment(n: int) -> str:
+    return f"wal-{n:06d}.log"
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    """
+    Append-only log segment with the fsync policy applied in wait().
+
+    append() is called with the journal lock held, so lines are in mutation
+    order; it goes straight to os.write, with no user-space buffer to flush.
+    """
+
+    def __init__(self, directory: str, segment: int, policy: str = FSYNC_POLICY, interval: float = FSYNC_INTERVAL):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown fsync policy {policy!r}, expected one of {POLICIES}")
+        self.directory = directory
+        self.policy = policy
+        self.interval = interval
+        self.segment = segment
+        self._fd = self._open(segment)
+        self._fd_lock = threading.Lock()  # fsync vs segment rotation
+        self._cond = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self.fsyncs = 0
+        self._stop = threading.Event()
+        self._flusher = None
+        if policy == "interval":
+            self._flusher = threading.Thread(target=self._flush_forever, name="wal-fsync", daemon=True)
+            self._flusher.start()
+
+    def _open(self, segment: int) -> int:
+        fd = os.open(os.path.join(self.directory, _segment(segment)), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        _fsync_dir(self.directory)
+        self._size = os.fstat(fd).st_size
+        return fd
+
+    def append(self, op: dict) -> int:
+        """Write one op; return its sequence number for wait()."""
+        line = _encode(op)
+        pending = memoryview(line)
+        try:
+            # os.write may take only part of the line
+            while pending:
+                pending = pending[os.write(self._fd, pending):]
+        except BaseException:
+            # never leave half a record behind: the next one would be glued to it,
+            # and replay would drop both and everything after as a torn tail
+            os.ftruncate(self._fd, self._size)
+            raise
+        self._size += len(line)
+        self._written += 1
+        if self.policy == "always":
+            self.sync()
+        return self._written
+
+    def sync(self) -> None:
+        target = self._written
+        with self._fd_lock:
+            os.fsync(self._fd)
+        self.fsyncs += 1
+        with self._cond:
+            self._synced = max(self._synced, target)
+            self._cond.notify_all()
+
+    def wait(self, seq: int) -> None:
+        """Return once op seq is as durable as the policy promises."""
+        if self.policy != "group":
+            return
+        with self._cond:
+            while self._synced < seq:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                # leader: one fsync for everything written so far, followers wake up with it
+                self._syncing = True
+                self._cond.release()
+                try:
+                    self.sync()
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._cond.notify_all()
+
+    def _flush_forever(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self._synced < self._written:
+                self.sync()
+
+    def rotate(self) -> int:
+        """Make everything so far durable and continue in a new segment (journal lock held)."""
+        with self._fd_lock:
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self.segment += 1
+            self._fd = self._open(self.segment)
+        with self._cond:
+            self._synced = self._written
+            self._cond.notify_all()
+        return self.segment
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.sync()
+        os.close(self._fd)
+
+
+class _Txn:
+    __slots__ = ("journal", "seq")
+
+    def __init__(self, journal: "Journal"):
+        self.journal = journal
+        self.seq = 0
+
+    def put(self, record: dict) -> None:
+        self.seq = self.journal._log({"op": "put", "rec": record})
+
+    def delete(self, bookmark_id: int) -> None:
+        self.seq = self.journal._log({"op": "del", "id": bookmark_id})
+
+
+class Journal:
+    """
+    Ties the store to the log. Mutations run inside write():
+
+        with JOURNAL.write() as txn:
+            txn.put(bookmark)
+            BOOKMARKS.add(bookmark)
+
+    The append comes first: if it fails, the store is untouched and the error
+    reaches the client, so memory never holds a change the log does not.
+    Both happen under one lock, so the log has the same order as memory;
+    waiting for the fsync happens after the lock is released, which is what
+    lets concurrent writers share one fsync.
+    With no directory the journal only provides the lock.
+    """
+
+    def __init__(
+        self,
+        store: BookmarkStore,
+        directory: Optional[str] = DATA_DIR or None,
+        policy: str = FSYNC_POLICY,
+        interval: float = FSYNC_INTERVAL,
+        compact_every: int = COMPACT_EVERY,
+    ):
+        self.store = store
+        self.directory = directory
+        self.policy = policy
+        self.interval = interval
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self.wal: Optional[WriteAheadLog] = None
+        self.max_id = 0
+        self._since_snapshot = 0
+        self._compacting: Optional[threading.Thread] = None
+        self._compact_lock = threading.Lock()  # one snapshot writer at a time
+
+    @contextmanager
+    def write(self) -> Iterator[_Txn]:
+        txn = _Txn(self)
+        with self.lock:
+            yield txn
+        if txn.seq:
+            self.wal.wait(txn.seq)
+            if self._since_snapshot >= self.compact_every:
+                self.compact_in_background()
+
+    def _log(self, op: dict) -> int:
+        seq = 0
+        if self.wal is not None:
+            seq = self.wal.append(op)
+            self._since_snapshot += 1
+        if op["op"] == "put":
+            self.max_id = max(self.max_id, op["rec"]["id"])
+        return seq
+
+    def open(self) -> int:
+        """Load snapshot + log into the store and start a fresh segment; return the next id."""
+        if self.directory is None:
+            return self.max_id + 1
+        os.makedirs(self.directory, exist_ok=True)
+        first = self._load_snapshot()
+        segments = self._segments()
+        for n in segments:
+            if n >= first:
+                self._replay(n, last=n == segments[-1])
+        self.wal = WriteAheadLog(self.directory, max(segments, default=first - 1) + 1, self.policy, self.interval)
+        return self.max_id + 1
+
+    def close(self) -> None:
+        if self._compacting is not None:
+            self._compacting.join()
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(name[4:-4]) for name in os.listdir(self.directory)
+            if name.startswith("wal-") and name.endswith(".log")
+        )
+
+    def _load_snapshot(self) -> int:
+        """Records from the snapshot; return the first log segment not folded into it."""
+        path = os.path.join(self.directory, SNAPSHOT)
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            header = _decode(f.readline())
+            if header is None:
+                raise ValueError(f"corrupt snapshot header in {path}")
+            for line in f:
+                data = _decode(line)
+                if data is None:
+                    raise ValueError(f"corrupt snapshot {path}")
+                self.store.add(_record(data))
+        self.max_id = header["max_id"]
+        return header["wal"]
+
+    def _replay(self, segment: int, last: bool) -> None:
+        path = os.path.join(self.directory, _segment(segment))
+        store = self.store
+        with open(path, "rb") as f:
+            offset = 0
+            for line in f:
+                op = _decode(line) if line.endswith(b"\n") else None
+                if op is None:
+                    # a torn tail is the write that was in flight during a crash
+                    if not last:
+                        raise ValueError(f"corrupt log segment {path} at byte {offset}")
+                    os.truncate(path, offset)
+                    return
+                offset += len(line)
+                if op["op"] == "put":
+                    record = _record(op["rec"])
+                    bookmark_id = record["id"]
+                    self.max_id = max(self.max_id, bookmark_id)
+                    if bookmark_id in store:
+                        store.replace(bookmark_id, record)
+                    else:
+                        store.add(record)
+                else:
+                    store.remove(op["id"])
+                self._since_snapshot += 1
+
+    def compact_in_background(self) -> None:
+        with self.lock:
+            if self._compacting is not None and self._compacting.is_alive():
+                return
+            self._compacting = threading.Thread(target=self.compact, name="bookmarks-compact", daemon=True)
+            self._compacting.start()
+
+    def compact(self) -> None:
+        """
+        Fold the log into a new snapshot. Under the lock only the record list is
+        taken (records are immutable once stored) and the log switches to a new
+        segment; writing the snapshot does not block writers.
+        """
+        with self._compact_lock:
+            with self.lock:
+                records = self.store.records()
+                max_id = self.max_id
+                first = self.wal.rotate()
+                self._since_snapshot = 0
+            tmp = os.path.join(self.directory, SNAPSHOT + ".tmp")
+            with open(tmp, "wb") as f:
+                f.write(_encode({"max_id": max_id, "wal": first}))
+                f.writelines(_encode(record) for record in records)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(self.directory, SNAPSHOT))
+            _fsync_dir(self.directory)
+            for n in self._segments():
+                if n < first:
+                    os.remove(os.path.join(self.directory, _segment(n)))
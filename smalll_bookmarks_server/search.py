@@ -0,0 +1,213 @@
+import re
+from array import array
+from typing import Dict, Iterable, List, Mapping, Optional, Set
+
+GRAM = 3  # longest indexed n-gram; 1- and 2-grams are indexed too, for short needles
+DENSE = 0.2  # share of records above which a gram's postings no longer narrow a query down
+DENSE_MIN = 256  # postings this short are always used, whatever the share
+NARROW = 32  # intersect with a posting only while it is at most this many times the candidate set
+TOKEN_RE = re.compile(r"\w+")
+
+
+def _grams(text: str) -> Set[str]:
+    return {text[i:i + n] for n in range(1, GRAM + 1) for i in range(len(text) - n + 1)}
+
+
+def _needle_grams(needle: str) -> Set[str]:
+    n = min(len(needle), GRAM)
+    return {needle[i:i + n] for i in range(len(needle) - n + 1)}
+
+
+def _tokens(text: str) -> Set[str]:
+    return set(TOKEN_RE.findall(text))
+
+
+class TextIndex:
+    """
+    Inverted n-gram index over title and notes, kept up to date by BookmarkStore.
+
+    Every 1-, 2- and 3-gram of the needle must occur in the record, so the
+    postings of the needle's grams (3-grams, or the needle itself when it is
+    shorter) give a small candidate set that is then checked with the same `in`
+    test as before, against the stored record.
+
+    Postings are append-only arrays of 4-byte ids rather than sets, and texts
+    are not copied, which keeps the index at about 1.4 KB for a bookmark with
+    36 words of text instead of about 10 KB (bench/bench_search.py prints it).
+    A removed or rewritten record is not taken out of its postings: the final
+    check drops it, and a posting is rewritten once half of it is dead entries.
+    """
+
+    FIELDS = ("title", "notes")
+
+    def __init__(self, records: Mapping[int, dict]):
+        self._records = records  # the store's id -> record dict; texts are read from it
+        self._postings: Dict[str, array] = {}
+        self._dead: Dict[str, int] = {}
+
+    @staticmethod
+    def _texts_of(record: Optional[dict]) -> tuple:
+        if record is None:
+            return ("",) * len(TextIndex.FIELDS)
+        return tuple((record.get(field) or "").lower() for field in TextIndex.FIELDS)
+
+    @classmethod
+    def _grams_of(cls, record: dict) -> Set[str]:
+        return set().union(*(_grams(text) for text in cls._texts_of(record)))
+
+    def add(self, bookmark_id: int, record: dict) -> None:
+        self._append(bookmark_id, self._grams_of(record))
+
+    def remove(self, bookmark_id: int, record: dict) -> None:
+        self._bury(self._grams_of(record))
+
+    def update(self, bookmark_id: int, old: dict, record: dict) -> None:
+        before, after = self._grams_of(old), self._grams_of(record)
+        self._bury(before - after)
+        self._append(bookmark_id, after - before)
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._dead.clear()
+
+    def _append(self, bookmark_id: int, grams: Iterable[str]) -> None:
+        postings = self._postings
+        for gram in grams:
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = array("I")
+            ids.append(bookmark_id)
+
+    def _bury(self, grams: Iterable[str]) -> None:
+        dead = self._dead
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if ids is None:
+                continue
+            n = dead[gram] = dead.get(gram, 0) + 1
+            if 2 * n >= len(ids):
+                self._rewrite(gram)
+
+    def _rewrite(self, gram: str) -> None:
+        # a copy is swapped in, so a reader iterating the old array is not disturbed
+        live = array("I", dict.fromkeys(i for i in self._postings[gram] if self.matches(i, gram)))
+        del self._dead[gram]
+        if live:
+            self._postings[gram] = live
+        else:
+            del self._postings[gram]
+
+    @staticmethod
+    def _discard(postings: Dict[str, Set[int]], term: str, bookmark_id: int) -> None:
+        ids = postings.get(term)
+        if ids is not None:
+            ids.discard(bookmark_id)
+            if not ids:
+                del postings[term]
+
+    def matches(self, bookmark_id: int, needle: str) -> bool:
+        record = self._records.get(bookmark_id)
+        if record is None:
+            return False
+        for field in self.FIELDS:
+            text = record.get(field)
+            if text and needle in text.lower():
+                return True
+        return False
+
+    def search(self, query: str) -> Optional[Set[int]]:
+        """
+        Ids whose title or notes contain query (case-insensitive).
+        None when the index would not narrow the query down: even the needle's
+        rarest gram occurs in more than DENSE of the records. For needles of up
+        to 3 characters the gram is the needle itself, so such queries match a
+        good share of the collection and the caller should filter a lazy
+        newest-first scan instead.
+        """
+        needle = query.lower()
+        if not needle:
+            return None
+        postings: List[array] = []
+        for gram in _needle_grams(needle):
+            ids = self._postings.get(gram)
+            if not ids:
+                return set()
+            postings.append(ids)
+        postings.sort(key=len)
+        if len(postings[0]) > max(DENSE * len(self._records), DENSE_MIN):
+            return None
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            if not candidates or len(ids) > NARROW * len(candidates):
+                break  # checking the few candidates left is cheaper than a long posting
+            candidates.intersection_update(ids)
+        return {i for i in candidates if self.matches(i, needle)}
+
+    def rank(self, ids: Iterable[int], query: str) -> List[int]:
+        """
+        Ids by relevance: whole-word hits in the title weigh more than in the
+        notes, a substring hit in the title adds a point; ties go to newer ids.
+        """
+        needle = query.lower()
+        words = _tokens(needle)
+        word_re = re.compile(r"\b(?:%s)\b" % "|".join(map(re.escape, words))) if words else None
+
+        def score(bookmark_id: int) -> tuple:
+            title, notes = self._texts_of(self._records.get(bookmark_id))
+            points = 0
+            if word_re is not None:
+                in_title = set(word_re.findall(title))
+                points += 2 * len(in_title) + len(set(word_re.findall(notes)) - in_title)
+            if needle in title:
+                points += 1
+            return points, bookmark_id
+
+        return sorted(ids, key=score, reverse=True)
+
+
+class TagIndex:
+    """
+    tag -> ids and the set of favorite ids, kept up to date by BookmarkStore.
+    Tag counts are the sizes of the postings, so /tags never touches bookmarks.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, Set[int]] = {}
+        self._tags: Dict[int, tuple] = {}
+        self.favorites: Set[int] = set()
+
+    def add(self, bookmark_id: int, record: dict) -> None:
+        tags = tuple(record.get("tags") or ())
+        self._tags[bookmark_id] = tags
+        for tag in tags:
+            self._ids.setdefault(tag, set()).add(bookmark_id)
+        if record.get("favorite"):
+            self.favorites.add(bookmark_id)
+
+    def remove(self, bookmark_id: int) -> None:
+        for tag in self._tags.pop(bookmark_id, ()):
+            TextIndex._discard(self._ids, tag, bookmark_id)
+        self.favorites.discard(bookmark_id)
+
+    def update(self, bookmark_id: int, record: dict) -> None:
+        self.remove(bookmark_id)
+        self.add(bookmark_id, record)
+
+    def clear(self) -> None:
+        self._ids.clear()
+        self._tags.clear()
+        self.favorites.clear()
+
+    def ids(self, tags: Iterable[str], mode: str = "any") -> Set[int]:
+        """Ids tagged with any / all of tags."""
+        postings = [self._ids.get(tag, set()) for tag in tags]
+        if not postings:
+            return set()
+        if mode == "any":
+            return set().union(*postings)
+        postings.sort(key=len)
+        return set(postings[0]).intersection(*postings[1:])
+
+    def counts(self) -> Dict[str, int]:
+        # list() takes the items in one step, so a concurrent add cannot break the loop
+        return {tag: len(ids) for tag, ids in list(self._ids.items())}
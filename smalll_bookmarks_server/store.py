@@ -0,0 +1,109 @@
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional
+
+from search import TagIndex, TextIndex
+
+
+class BookmarkStore:
+    """
+    In-memory bookmark storage.
+
+    Records live in an id -> record dict, so get/update/replace/delete are O(1).
+    Ids are handed out in increasing order, so an append-only list of ids keeps
+    them sorted: deleting only drops the record from the dict and leaves a
+    tombstone in the list, which is compacted once tombstones make up half of it.
+
+    Secondary indexes are updated by every mutation here, so records must only
+    be changed through these methods. Stored records are never modified in
+    place (update swaps in a new dict), so a list of them is a consistent
+    point-in-time copy for snapshots.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[int, dict] = {}
+        self._order: List[int] = []
+        self.text = TextIndex(self._by_id)
+        self.tags = TagIndex()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, bookmark_id: int) -> bool:
+        return bookmark_id in self._by_id
+
+    def __iter__(self) -> Iterator[dict]:
+        """Records in ascending id order."""
+        for bookmark_id in self._order:
+            record = self._by_id.get(bookmark_id)
+            if record is not None:
+                yield record
+
+    def __reversed__(self) -> Iterator[dict]:
+        """Records in descending id order, newest first; lazy."""
+        return self.newest()
+
+    def newest(self, before: Optional[int] = None) -> Iterator[dict]:
+        """
+        Records with id < before (all if None), newest first. The start is
+        found by bisect, so a keyset page costs O(log n + page) however deep it is.
+        """
+        order = self._order
+        pos = len(order) if before is None else bisect_left(order, before)
+        for pos in range(pos - 1, -1, -1):
+            record = self._by_id.get(order[pos])
+            if record is not None:
+                yield record
+
+    def get(self, bookmark_id: int) -> Optional[dict]:
+        return self._by_id.get(bookmark_id)
+
+    def add(self, record: dict) -> dict:
+        bookmark_id = record["id"]
+        if self._order and bookmark_id <= self._order[-1]:
+            raise ValueError("bookmark ids must increase")
+        self._by_id[bookmark_id] = record
+        self._order.append(bookmark_id)
+        self.text.add(bookmark_id, record)
+        self.tags.add(bookmark_id, record)
+        return record
+
+    def update(self, bookmark_id: int, fields: dict) -> Optional[dict]:
+        old = self._by_id.get(bookmark_id)
+        if old is None:
+            return None
+        record = self._by_id[bookmark_id] = {**old, **fields}
+        self.text.update(bookmark_id, old, record)
+        self.tags.update(bookmark_id, record)
+        return record
+
+    def replace(self, bookmark_id: int, record: dict) -> Optional[dict]:
+        old = self._by_id.get(bookmark_id)
+        if old is None:
+            return None
+        self._by_id[bookmark_id] = record
+        self.text.update(bookmark_id, old, record)
+        self.tags.update(bookmark_id, record)
+        return record
+
+    def remove(self, bookmark_id: int) -> Optional[dict]:
+        record = self._by_id.pop(bookmark_id, None)
+        if record is None:
+            return None
+        self.text.remove(bookmark_id, record)
+        self.tags.remove(bookmark_id)
+        if len(self._order) > 2 * len(self._by_id) + 64:
+            self._compact()
+        return record
+
+    def records(self) -> List[dict]:
+        """All records in ascending id order."""
+        return list(self._by_id.values())
+
+    def clear(self) -> None:
+        self._by_id.clear()
+        self._order.clear()
+        self.text.clear()
+        self.tags.clear()
+
+    def _compact(self) -> None:
+        self._order = [i for i in self._order if i in self._by_id]
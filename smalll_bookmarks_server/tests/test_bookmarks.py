@@ -124,3 +124,203 @@ def test_list_query_filters():
     r2 = client.get("/bookmarks?limit=1&skip=1")
     assert r2.status_code == 200
     assert len(r2.json()) == 1
+
+def test_store_lookups_and_order_survive_deletes():
+    from store import BookmarkStore
+    store = BookmarkStore()
+    for i in range(1, 301):
+        store.add({"id": i, "title": f"t{i}"})
+    for i in range(1, 301):
+        if i % 3:
+            store.remove(i)
+    assert len(store) == 100
+    assert len(store._order) < 300  # tombstones were compacted
+    assert store.get(3)["title"] == "t3" and store.get(4) is None
+    assert [r["id"] for r in reversed(store)][:3] == [300, 297, 294]
+    assert [r["id"] for r in store][:3] == [3, 6, 9]
+    assert store.update(5, {"title": "x"}) is None
+    with pytest.raises(ValueError):
+        store.add({"id": 2})
+
+def test_search_index_follows_mutations():
+    a = _create_sample(title="Async Python", notes="event loop")
+    b = _create_sample(title="Databases", notes="python drivers")
+    _create_sample(title="Rust", notes=None)
+
+    def titles(**params):
+        r = client.get("/bookmarks", params=params)
+        assert r.status_code == 200
+        return [x["title"] for x in r.json()]
+
+    assert titles(q="PYTHON") == ["Databases", "Async Python"]
+    assert titles(q="python", order="relevance") == ["Async Python", "Databases"]
+    assert titles(q="ru") == ["Rust"]  # shorter than a trigram
+
+    client.patch(f"/bookmarks/{a['id']}", json={"title": "Async IO"})
+    assert titles(q="python") == ["Databases"]
+    assert titles(q="event loop") == ["Async IO"]
+
+    client.put(f"/bookmarks/{b['id']}", json={"title": "Postgres", "url": "https://pg.example/"})
+    assert titles(q="python") == []
+    client.delete(f"/bookmarks/{a['id']}")
+    assert titles(q="async") == []
+    assert main.BOOKMARKS.text.search("loop") == set()
+
+def test_search_index_answers_short_needles_and_drops_dead_entries():
+    from store import BookmarkStore
+
+    store = BookmarkStore()
+    for i in range(1, 1001):
+        store.add({"id": i, "title": f"item {i}", "notes": "xq" if i == 500 else None, "tags": []})
+    assert store.text.search("xq") == {500}  # a rare 2-char needle is answered by the index
+    assert store.text.search("q") == {500}
+    assert store.text.search("it") is None  # dense: the caller walks newest-first instead
+
+    postings = store.text._postings
+    for i in range(1, 1001, 2):
+        store.remove(i)
+    store.update(500, {"notes": None})
+    assert store.text.search("xq") == set()
+    assert "xq" not in postings
+    assert len(postings["ite"]) <= 750  # half-dead postings are rewritten
+    assert store.text.search("item 99") == {998, 996, 994, 992, 990}
+
+def test_tag_and_favorite_filters_and_tag_counts():
+    a = _create_sample(title="A", tags=["py", "web"])
+    b = _create_sample(title="B", tags=["py"])
+    _create_sample(title="C", tags=["go", "web"])
+    client.patch(f"/bookmarks/{b['id']}", json={"favorite": True})
+
+    def titles(**params):
+        r = client.get("/bookmarks", params=params)
+        assert r.status_code == 200, r.text
+        return [x["title"] for x in r.json()]
+
+    assert titles(tags="py") == ["B", "A"]
+    assert titles(tags=" WEB ,go") == ["C", "A"]
+    assert titles(tags="py,web", tags_match="all") == ["A"]
+    assert titles(favorite=True) == ["B"]
+    assert titles(favorite=False) == ["C", "A"]
+    assert titles(tags="py", favorite=False) == ["A"]
+    assert titles(tags="nope") == []
+
+    assert client.get("/tags").json() == [
+        {"tag": "py", "count": 2}, {"tag": "web", "count": 2}, {"tag": "go", "count": 1},
+    ]
+    client.put(f"/bookmarks/{a['id']}", json={"title": "A", "url": "https://a.example/", "tags": ["go"]})
+    client.delete(f"/bookmarks/{b['id']}")
+    assert client.get("/tags").json() == [{"tag": "go", "count": 2}, {"tag": "web", "count": 1}]
+    assert titles(favorite=True) == []
+
+def test_listing_pages_with_after_id_cursor():
+    for i in range(25):
+        _create_sample(title=f"b{i + 1}", tags=["even" if (i + 1) % 2 == 0 else "odd"])
+    for bid in (24, 23):
+        client.delete(f"/bookmarks/{bid}")
+
+    r = client.get("/bookmarks", params={"limit": 5})
+    assert [x["id"] for x in r.json()] == [25, 22, 21, 20, 19]
+    cursor = r.headers["x-next-after-id"]
+
+    seen = []
+    while cursor:
+        r = client.get("/bookmarks", params={"limit": 5, "after_id": cursor})
+        seen += [x["id"] for x in r.json()]
+        cursor = r.headers.get("x-next-after-id")
+    assert seen == list(range(18, 0, -1))
+
+    r = client.get("/bookmarks", params={"tags": "even", "limit": 3, "after_id": 20})
+    assert [x["id"] for x in r.json()] == [18, 16, 14]
+    assert client.get("/bookmarks", params={"after_id": 1}).json() == []
+    assert [x["id"] for x in reversed(main.BOOKMARKS)][:2] == [25, 22]
+
+def test_listing_skips_bookmarks_deleted_while_paging(monkeypatch):
+    for i in range(4):
+        _create_sample(title=f"deleted soon {i}")
+    rank = main.BOOKMARKS.text.rank
+
+    def rank_racing_delete(ids, query):
+        # a concurrent DELETE lands after the ids are picked, before they are fetched
+        main.BOOKMARKS.remove(3)
+        return rank(ids, query)
+
+    monkeypatch.setattr(main.BOOKMARKS.text, "rank", rank_racing_delete)
+    r = client.get("/bookmarks", params={"q": "deleted soon", "order": "relevance"})
+    assert r.status_code == 200
+    assert [x["id"] for x in r.json()] == [4, 2, 1]
+    assert main.BOOKMARKS.text.rank([3, 2], "deleted") == [2, 3]
+
+    search = main.BOOKMARKS.text.search
+
+    def search_racing_delete(q):
+        ids = search(q)
+        main.BOOKMARKS.remove(4)
+        return ids
+
+    monkeypatch.setattr(main.BOOKMARKS.text, "search", search_racing_delete)
+    r = client.get("/bookmarks", params={"q": "deleted soon", "limit": 2})
+    assert [x["id"] for x in r.json()] == [2]
+    assert r.headers["x-next-after-id"] == "2"  # the short page is not the last one
+
+def test_bookmarks_survive_restart_via_log_and_snapshot(tmp_path, monkeypatch):
+    from persistence import Journal
+
+    def restart(**kw):
+        main.BOOKMARKS.clear()
+        main.NEXT_ID = 1
+        monkeypatch.setattr(main, "JOURNAL", Journal(main.BOOKMARKS, str(tmp_path), **kw))
+        return TestClient(main.app)
+
+    with restart(policy="group") as c:
+        ids = [c.post("/bookmarks", json={"title": f"t{i}", "url": "https://ex.com/", "tags": ["py"]}).json()["id"] for i in range(4)]
+        c.patch(f"/bookmarks/{ids[0]}", json={"favorite": True, "notes": "kept"})
+        c.put(f"/bookmarks/{ids[1]}", json={"title": "replaced", "url": "https://new.example/"})
+        c.delete(f"/bookmarks/{ids[3]}")
+        before = c.get("/bookmarks").json()
+
+    with restart(policy="always", compact_every=2) as c:
+        assert c.get("/bookmarks").json() == before
+        assert c.get("/bookmarks", params={"q": "kept"}).json()[0]["id"] == ids[0]
+        assert c.get("/tags").json() == [{"tag": "py", "count": 2}]
+        # ids are not reused even though the newest bookmark was deleted
+        assert c.post("/bookmarks", json={"title": "new", "url": "https://ex.com/"}).json()["id"] == 5
+        main.JOURNAL.compact()
+        c.delete(f"/bookmarks/{ids[2]}")
+    assert (tmp_path / "snapshot.jsonl").exists()
+
+    # a torn last line (crash mid-write) is dropped, not fatal
+    last = sorted(tmp_path.glob("wal-*.log"))[-1]
+    with open(last, "ab") as f:
+        f.write(b"deadbeef {\"op\":\"del\"")
+    with restart(policy="never") as c:
+        assert [x["id"] for x in c.get("/bookmarks").json()] == [5, 2, 1]
+        assert c.get(f"/bookmarks/{ids[1]}").json()["title"] == "replaced"
+
+def test_failed_log_write_leaves_memory_and_log_intact(tmp_path, monkeypatch):
+    import persistence
+
+    journal = persistence.Journal(main.BOOKMARKS, str(tmp_path), policy="never")
+    monkeypatch.setattr(main, "JOURNAL", journal)
+    write = os.write
+    failing = []
+
+    def short_write(fd, data):
+        if failing and failing.pop():
+            raise OSError(28, "No space left on device")
+        # the kernel may take less than asked for; append must finish the line
+        return write(fd, bytes(data[: max(1, len(data) // 2)]))
+
+    with TestClient(main.app, raise_server_exceptions=False) as c:
+        monkeypatch.setattr(persistence.os, "write", short_write)
+        assert c.post("/bookmarks", json={"title": "kept", "url": "https://ex.com/"}).status_code == 201
+        failing[:] = [True, False]  # one partial chunk gets through, then the disk fills up
+        r = c.post("/bookmarks", json={"title": "lost", "url": "https://ex.com/"})
+        assert r.status_code == 500
+        assert [x["title"] for x in c.get("/bookmarks").json()] == ["kept"]
+        monkeypatch.setattr(persistence.os, "write", write)
+        assert c.post("/bookmarks", json={"title": "after", "url": "https://ex.com/"}).json()["id"] == 2
+
+    main.BOOKMARKS.clear()
+    monkeypatch.setattr(main, "JOURNAL", persistence.Journal(main.BOOKMARKS, str(tmp_path), policy="never"))
+    with TestClient(main.app) as c:
+        assert [x["title"] for x in c.get("/bookmarks").json()] == ["after", "kept"]